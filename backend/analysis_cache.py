@@ -0,0 +1,238 @@
+"""
+Content-addressed cache for Gemini analysis results
+Results are keyed on the image bytes plus everything that influences the model
+output (prompt version, generation config), so a re-submitted screenshot skips
+the download/encode/Gemini round trip entirely
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def hash_image(image_bytes: bytes) -> str:
+    """SHA-256 hex digest of the raw image bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def make_cache_key(image_digest: str, prompt_version: str, generation_config: Dict) -> str:
+    """
+    Build the cache key for an analysis
+
+    Args:
+        image_digest: SHA-256 hex digest of the image bytes (see hash_image)
+        prompt_version: Version/hash of the prompt sent with the image
+        generation_config: Generation parameters sent to Gemini
+
+    Returns:
+        str: Hex digest identifying this (image, prompt, config) combination
+    """
+    config_str = json.dumps(generation_config, sort_keys=True, default=str)
+    return hashlib.sha256(f"{image_digest}:{prompt_version}:{config_str}".encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """In-process LRU tier with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """Persistent tier backed by a local SQLite file"""
+
+    def __init__(self, path: str = "analysis_cache.sqlite3", purge_every: int = 500):
+        """
+        Args:
+            path: SQLite file path
+            purge_every: Delete expired rows once per this many writes
+        """
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS analysis_cache_expires_at ON analysis_cache (expires_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            # Drop expired rows now and then so the file doesn't grow forever
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self._conn.execute("DELETE FROM analysis_cache WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+
+class SupabaseTier:
+    """
+    Persistent tier backed by a Supabase table
+
+    Expects a table `analysis_cache (key text primary key, value jsonb, expires_at timestamptz)`
+    """
+
+    def __init__(self, supabase_client, table: str = "analysis_cache"):
+        self.supabase = supabase_client
+        self.table = table
+
+    def get(self, key: str) -> Optional[Dict]:
+        response = self.supabase.table(self.table).select("value, expires_at").eq("key", key).limit(1).execute()
+        if not response.data:
+            return None
+        row = response.data[0]
+        expires_at = row.get("expires_at")
+        if expires_at and _parse_timestamp(expires_at) < time.time():
+            return None
+        return row["value"]
+
+    def set(self, key: str, value: Dict, expires_at: float):
+        self.supabase.table(self.table).upsert({
+            "key": key,
+            "value": value,
+            "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(expires_at))
+        }).execute()
+
+
+def _parse_timestamp(value: str) -> float:
+    """Parse a Postgres/ISO timestamp into epoch seconds"""
+    from datetime import datetime
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class AnalysisCache:
+    """
+    Two-tier cache of parsed analysis results ({score, suggestions, reasoning})
+
+    The memory tier is checked first; misses fall through to the optional
+    persistent tier (queried in a worker thread) and hits there are promoted
+    back into memory.
+    """
+
+    def __init__(self, ttl_seconds: int = 7 * 24 * 3600, max_entries: int = 1024, persistent=None):
+        self.ttl_seconds = ttl_seconds
+        self.memory = MemoryTier(max_entries)
+        self.persistent = persistent
+        self.counters = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "errors": 0,
+        }
+
+    async def get(self, key: str) -> Optional[Dict]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+            return value
+
+        if self.persistent is not None:
+            try:
+                value = await asyncio.to_thread(self.persistent.get, key)
+            except Exception as e:
+                logger.warning("⚠️ Analysis cache lookup failed: %s", e)
+                self.counters["errors"] += 1
+                value = None
+            if value is not None:
+                self.counters["persistent_hits"] += 1
+                self.memory.set(key, value, time.time() + self.ttl_seconds)
+                return value
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict):
+        expires_at = time.time() + self.ttl_seconds
+        self.memory.set(key, value, expires_at)
+        self.counters["sets"] += 1
+        if self.persistent is not None:
+            try:
+                await asyncio.to_thread(self.persistent.set, key, value, expires_at)
+            except Exception as e:
+                logger.warning("⚠️ Analysis cache write failed: %s", e)
+                self.counters["errors"] += 1
+
+    def stats(self) -> Dict:
+        hits = self.counters["memory_hits"] + self.counters["persistent_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hits": hits,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "persistent_tier": type(self.persistent).__name__ if self.persistent else None,
+        }
+
+
+def create_analysis_cache(supabase_client=None) -> AnalysisCache:
+    """
+    Build the analysis cache from environment settings
+
+    ANALYSIS_CACHE_BACKEND: "sqlite" (default), "supabase" or "none"
+    ANALYSIS_CACHE_PATH: SQLite file path (default analysis_cache.sqlite3)
+    ANALYSIS_CACHE_TTL: Entry lifetime in seconds (default 7 days)
+    ANALYSIS_CACHE_SIZE: Max in-memory entries (default 1024)
+    """
+    backend = os.getenv("ANALYSIS_CACHE_BACKEND", "sqlite").lower()
+    ttl = int(os.getenv("ANALYSIS_CACHE_TTL", 7 * 24 * 3600))
+    size = int(os.getenv("ANALYSIS_CACHE_SIZE", 1024))
+
+    persistent = None
+    try:
+        if backend == "sqlite":
+            persistent = SQLiteTier(os.getenv("ANALYSIS_CACHE_PATH", "analysis_cache.sqlite3"))
+        elif backend == "supabase" and supabase_client is not None:
+            persistent = SupabaseTier(supabase_client)
+    except Exception as e:
+        logger.warning("⚠️ Could not open persistent analysis cache (%s): %s, using memory only", backend, e)
+        persistent = None
+
+    return AnalysisCache(ttl_seconds=ttl, max_entries=size, persistent=persistent)
@@ -0,0 +1,93 @@
+"""
+Shared helpers for the offline benchmarks: timing, result records and JSON output.
+
+Every benchmark module exposes `run(runs) -> Dict[str, Dict]` mapping a case
+name to a result record (see `measure`), so run_all.py can collect them into
+one JSON document and compare it with a previous one.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+TEST_IMAGE = os.path.join(REPO_DIR, "tests", "test1.jpeg")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from metrics import percentile  # noqa: E402  (needs backend/ on sys.path)
+
+
+def summarize(timings_ms: List[float], **extra: Any) -> Dict:
+    """Result record for a list of per-run timings in milliseconds"""
+    ordered = sorted(timings_ms)
+    return {
+        "runs": len(ordered),
+        "median_ms": round(statistics.median(ordered), 4),
+        "p95_ms": percentile(ordered, 0.95, 4),
+        "min_ms": round(ordered[0], 4),
+        **extra,
+    }
+
+
+def measure(fn: Callable[[], Any], runs: int, warmup: int = 1, **extra: Any) -> Dict:
+    """
+    Time `fn` over `runs` calls after `warmup` untimed calls
+
+    Args:
+        fn: Zero-argument callable to time
+        runs: Timed calls
+        warmup: Untimed calls first (caches, lazy imports)
+        **extra: Copied into the result record (sizes, row counts, ...)
+
+    Returns:
+        Dict with runs, median_ms, p95_ms, min_ms and the extras
+    """
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings, **extra)
+
+
+def environment() -> Dict:
+    """Where the numbers came from, so results from different machines aren't compared blindly"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def print_results(suite: str, results: Dict[str, Dict]):
+    for case, record in results.items():
+        extras = ", ".join(f"{key}={value}" for key, value in record.items() if not key.endswith("_ms") and key != "runs")
+        print(f"⏱️  {suite}.{case:<40} median {record['median_ms']:9.3f} ms   p95 {record['p95_ms']:9.3f} ms"
+              + (f"   ({extras})" if extras else ""))
+
+
+def write_json(path: str, document: Dict):
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write("\n")
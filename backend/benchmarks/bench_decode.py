@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark the image stages before Gemini: decode, normalize and base64 encode.
+
+Usage:
+    python benchmarks/bench_decode.py [image_path] [--runs N] [--json out.json]
+"""
+import argparse
+import base64
+import hashlib
+import io
+from typing import Dict
+
+# bench_common also puts backend/ on sys.path
+from bench_common import TEST_IMAGE, environment, measure, print_results, write_json
+from PIL import Image
+
+from image_utils import get_normalize_config, normalize_screenshot
+
+
+def run(runs: int = 20, image_path: str = TEST_IMAGE) -> Dict[str, Dict]:
+    with open(image_path, "rb") as f:
+        contents = f.read()
+    config = get_normalize_config()
+
+    def decode():
+        with Image.open(io.BytesIO(contents)) as img:
+            img.load()
+
+    def normalize():
+        return normalize_screenshot(
+            contents,
+            config["max_long_edge"],
+            config["format"],
+            config["quality"],
+            config["color"]
+        )
+
+    normalized, _ = normalize()
+    return {
+        "decode": measure(decode, runs, bytes=len(contents)),
+        "sha256": measure(lambda: hashlib.sha256(contents).hexdigest(), runs, bytes=len(contents)),
+        "normalize": measure(normalize, runs, bytes=len(contents), output_bytes=len(normalized)),
+        "base64_raw": measure(lambda: base64.b64encode(contents).decode("utf-8"), runs, bytes=len(contents)),
+        "base64_normalized": measure(lambda: base64.b64encode(normalized).decode("utf-8"), runs, bytes=len(normalized)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image decode, normalize and base64")
+    parser.add_argument("image", nargs="?", default=TEST_IMAGE)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.runs, args.image)
+    print_results("decode", results)
+    if args.json:
+        write_json(args.json, {"environment": environment(), "results": {"decode": results}})
+
+
+if __name__ == "__main__":
+    main()
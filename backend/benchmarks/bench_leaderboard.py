@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark leaderboard aggregation over synthetic score tables.
+
+For each table size: a full rebuild of every window (what reconcile does),
+folding 1k new rows into the materialized windows (what each score flush
+does), and reading a first and a deep page.
+
+Usage:
+    python benchmarks/bench_leaderboard.py [--sizes 1000,10000,100000,1000000] [--runs N] [--json out.json]
+"""
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+# bench_common also puts backend/ on sys.path
+from bench_common import environment, measure, print_results, write_json
+from leaderboard import MaterializedLeaderboard, build_windows
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+NEW_ROWS = 1_000
+
+
+def synthetic_rows(count: int, now: datetime, seed: int = 42) -> List[Dict]:
+    """
+    Score rows shaped like load_all_scores() output
+
+    About 20 scores per nickname, spread over the last 30 days so the daily
+    and weekly windows each see a realistic share of the table.
+    """
+    rng = random.Random(seed)
+    nicknames = [f"user{index}" for index in range(max(50, count // 20))]
+    return [
+        {
+            "nickname": rng.choice(nicknames),
+            "rizz_score": rng.randint(0, 100),
+            "created_at": (now - timedelta(seconds=rng.randint(0, 30 * 86400))).isoformat(),
+        }
+        for _ in range(count)
+    ]
+
+
+def runs_for(size: int, runs: int) -> int:
+    """Fewer repetitions for the big tables; a 1M-row rebuild is measured once"""
+    return max(1, runs * 10_000 // max(size, 10_000))
+
+
+def run(runs: int = 10, sizes=DEFAULT_SIZES) -> Dict[str, Dict]:
+    now = datetime.now(timezone.utc)
+    new_rows = [{**row, "created_at": now.isoformat()} for row in synthetic_rows(NEW_ROWS, now, seed=7)]
+    results = {}
+    for size in sizes:
+        rows = synthetic_rows(size, now)
+        size_runs = runs_for(size, runs)
+        warmup = 1 if size <= 100_000 else 0
+        results[f"build_windows_{size}"] = measure(lambda: build_windows(rows, now), size_runs, warmup=warmup, rows=size)
+
+        leaderboard = MaterializedLeaderboard(load_rows=None)
+        leaderboard.windows = build_windows(rows, now)
+        nicknames = len(leaderboard.aggregate)
+        # Each run folds the same 1k rows in again; totals grow but the index size doesn't
+        results[f"record_{NEW_ROWS}_{size}"] = measure(lambda: leaderboard.record(new_rows), runs, rows=size, nicknames=nicknames)
+
+        _, middle = leaderboard.page("all", nicknames // 2)
+        results[f"page_first_{size}"] = measure(lambda: leaderboard.page("all", 10), runs * 10, rows=size)
+        results[f"page_deep_{size}"] = measure(lambda: leaderboard.page("all", 10, middle), runs * 10, rows=size)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark leaderboard aggregation on synthetic score tables")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma-separated table sizes")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.runs, [int(size) for size in args.sizes.split(",")])
+    print_results("leaderboard", results)
+    if args.json:
+        write_json(args.json, {"environment": environment(), "results": {"leaderboard": results}})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark meme rendering: per-template generate_meme time.
+
+Templates whose image is missing are skipped rather than timed:
+generate_meme would quietly render a substitute under the missing one's id.
+
+Usage:
+    python benchmarks/bench_meme.py [--runs N] [--score S] [--json out.json]
+"""
+import argparse
+import logging
+from typing import Dict
+
+# bench_common also puts backend/ on sys.path
+from bench_common import environment, measure, print_results, write_json
+from meme_generator import generate_meme, warm_template_cache
+from meme_templates import MEME_TEMPLATES, get_available_templates
+
+
+def run(runs: int = 20, score: int = 42) -> Dict[str, Dict]:
+    # Keep one-off template/font loading out of the timings
+    warm_template_cache()
+    results = {}
+    available = get_available_templates()
+    missing = [template["id"] for template in MEME_TEMPLATES if template not in available]
+    if missing:
+        print(f"⚠️ Skipping templates without an image: {', '.join(missing)}")
+    for template in available:
+        meme_bytes = generate_meme(score, template["id"])
+        results[template["id"]] = measure(
+            lambda: generate_meme(score, template["id"]),
+            runs,
+            warmup=0,
+            output_bytes=len(meme_bytes)
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generate_meme per template")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--score", type=int, default=42)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run(args.runs, args.score)
+    print_results("meme", results)
+    if args.json:
+        write_json(args.json, {"environment": environment(), "results": {"meme": results}})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark Gemini response parsing over a corpus of recorded replies.
+
+The corpus (fixtures/gemini_responses.json) mixes clean replies, replies the
+parser has to repair and malformed ones; each entry records which of those
+it is expected to be, and the benchmark fails if the parser disagrees.
+
+Usage:
+    python benchmarks/bench_parser.py [--runs N] [--json out.json]
+"""
+import argparse
+import json
+import logging
+import os
+from typing import Dict, List
+
+# bench_common also puts backend/ on sys.path
+from bench_common import FIXTURES_DIR, environment, measure, print_results, write_json
+from response_parser import JSON_DECODER, MalformedResponse, ResponseParser
+
+CORPUS_PATH = os.path.join(FIXTURES_DIR, "gemini_responses.json")
+
+
+def load_corpus(path: str = CORPUS_PATH) -> List[Dict]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def classify(parser: ResponseParser, text: str) -> str:
+    """clean, repaired or malformed, as the parser sees `text`"""
+    repaired = parser.counters["repaired"]
+    try:
+        parser.parse(text)
+    except MalformedResponse:
+        return "malformed"
+    return "repaired" if parser.counters["repaired"] > repaired else "clean"
+
+
+def check_corpus(corpus: List[Dict]):
+    """Raise if any entry doesn't parse the way it is labelled"""
+    parser = ResponseParser()
+    mismatches = [
+        f"{entry['name']}: expected {entry['expect']}, got {actual}"
+        for entry in corpus
+        if (actual := classify(parser, entry["text"])) != entry["expect"]
+    ]
+    if mismatches:
+        raise AssertionError("Parser corpus mismatch:\n  " + "\n  ".join(mismatches))
+
+
+def parse_all(parser: ResponseParser, texts: List[str]):
+    for text in texts:
+        try:
+            parser.parse(text)
+        except MalformedResponse:
+            pass
+
+
+def run(runs: int = 200) -> Dict[str, Dict]:
+    corpus = load_corpus()
+    check_corpus(corpus)
+    # Repairs are logged at INFO; keep logging out of the timings
+    logging.getLogger("response_parser").setLevel(logging.WARNING)
+
+    parser = ResponseParser()
+    results = {}
+    groups = {"corpus": [entry["text"] for entry in corpus]}
+    for kind in ("clean", "repaired", "malformed"):
+        groups[kind] = [entry["text"] for entry in corpus if entry["expect"] == kind]
+    for name, texts in groups.items():
+        results[name] = measure(
+            lambda: parse_all(parser, texts),
+            runs,
+            responses=len(texts),
+            decoder=JSON_DECODER
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ResponseParser over recorded Gemini replies")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    print_results("parser", results)
+    if args.json:
+        write_json(args.json, {"environment": environment(), "results": {"parser": results}})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark screenshot normalization: payload size, preprocessing time and
+(optionally) Gemini latency/score stability for raw vs normalized images.
+
+Usage:
+    python benchmarks/bench_preprocess.py [image_path] [--runs N] [--score]
+
+--score calls the real Gemini API (needs GEMINI_API_KEY) and compares the
+score distribution and latency of the raw and normalized payloads.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from image_utils import get_normalize_config, normalize_screenshot, sniff_image_type
+
+DEFAULT_IMAGE = os.path.join(BACKEND_DIR, "..", "tests", "test1.jpeg")
+
+
+def bench_normalize(contents: bytes, config: dict, runs: int):
+    """Time normalize_screenshot and report payload sizes"""
+    timings = []
+    normalized, mime_type = contents, None
+    for _ in range(runs):
+        start = time.perf_counter()
+        normalized, mime_type = normalize_screenshot(
+            contents,
+            config["max_long_edge"],
+            config["format"],
+            config["quality"],
+            config["color"]
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+
+    raw_b64 = len(base64.b64encode(contents))
+    norm_b64 = len(base64.b64encode(normalized))
+    print(f"📐 Settings: {config}")
+    print(f"📦 Raw:        {len(contents):>9} bytes  base64 {raw_b64:>9}")
+    print(f"📦 Normalized: {len(normalized):>9} bytes  base64 {norm_b64:>9}  ({mime_type})")
+    print(f"📉 Payload reduction: {100 * (1 - norm_b64 / raw_b64):.1f}%")
+    print(f"⏱️  Normalize: median {statistics.median(timings):.1f} ms, max {max(timings):.1f} ms over {runs} runs")
+    return normalized, mime_type
+
+
+async def score_payload(model, prompt: str, contents: bytes, mime_type: str, runs: int):
+    """Call Gemini `runs` times with one payload, returning (scores, latencies)"""
+    from google.generativeai.types import GenerationConfig
+    from main import GENERATION_CONFIG
+
+    scores, latencies = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = await model.generate_content_async(
+            [prompt, {"mime_type": mime_type, "data": base64.b64encode(contents).decode("utf-8")}],
+            generation_config=GenerationConfig(**GENERATION_CONFIG)
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        try:
+            scores.append(json.loads(response.text)["score"])
+        except (ValueError, KeyError):
+            print(f"⚠️ Unparseable response: {response.text[:100]}")
+    return scores, latencies
+
+
+def summarize(label: str, scores, latencies):
+    spread = statistics.pstdev(scores) if len(scores) > 1 else 0.0
+    mean = statistics.mean(scores) if scores else float("nan")
+    print(f"🎯 {label:<10} score mean {mean:.1f} ± {spread:.1f}  latency median {statistics.median(latencies):.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", default=DEFAULT_IMAGE)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--score", action="store_true", help="Also call Gemini to compare scores/latency")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        contents = f.read()
+    raw_mime = sniff_image_type(contents[:16]) or "image/jpeg"
+
+    normalized, mime_type = bench_normalize(contents, get_normalize_config(), args.runs)
+
+    if args.score:
+        from main import RIZZ_PROMPT, model
+
+        async def compare(runs: int):
+            # One event loop for both runs: the async Gemini client is bound to it
+            summarize("raw", *await score_payload(model, RIZZ_PROMPT, contents, raw_mime, runs))
+            summarize("normalized", *await score_payload(model, RIZZ_PROMPT, normalized, mime_type, runs))
+
+        asyncio.run(compare(max(3, args.runs // 2)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Run every offline benchmark and write one JSON document of results.
+
+Nothing here touches the network: images come from tests/, Gemini replies
+from fixtures/ and score tables are synthetic. Pass --compare with the JSON
+from an earlier commit to see per-case median changes.
+
+Usage:
+    python benchmarks/run_all.py [--out results.json] [--compare baseline.json]
+                                 [--threshold 0.2] [--quick] [--only parser,leaderboard]
+
+Exits with status 1 when --compare finds a case slower than the threshold.
+"""
+import argparse
+import json
+import logging
+import sys
+from typing import Dict
+
+from bench_common import environment, print_results, write_json
+import bench_decode
+import bench_leaderboard
+import bench_meme
+import bench_parser
+
+# suite -> (full run, --quick run)
+SUITES = {
+    "decode": (lambda: bench_decode.run(20), lambda: bench_decode.run(5)),
+    "meme": (lambda: bench_meme.run(10), lambda: bench_meme.run(3)),
+    "parser": (lambda: bench_parser.run(200), lambda: bench_parser.run(50)),
+    "leaderboard": (
+        lambda: bench_leaderboard.run(10),
+        lambda: bench_leaderboard.run(3, (1_000, 10_000, 100_000))
+    ),
+}
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> int:
+    """
+    Print median changes against a baseline document
+
+    Returns:
+        int: Number of cases slower than baseline by more than `threshold` (a ratio)
+    """
+    baseline_commit = baseline.get("environment", {}).get("commit")
+    print(f"\n📊 Compared with {baseline_commit or 'baseline'} (threshold {threshold:.0%})")
+    if baseline.get("environment", {}).get("machine") != current["environment"]["machine"]:
+        print("⚠️ Baseline was recorded on a different machine type; treat differences with care")
+
+    regressions = 0
+    for suite, cases in current["results"].items():
+        for case, record in cases.items():
+            before = baseline.get("results", {}).get(suite, {}).get(case)
+            if before is None:
+                continue
+            change = record["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+            marker = "🔺" if change > threshold else "🔻" if change < -threshold else "  "
+            regressions += change > threshold
+            print(f"{marker} {suite}.{case:<40} {before['median_ms']:9.3f} -> {record['median_ms']:9.3f} ms  ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="benchmark-results.json", help="Where to write the results")
+    parser.add_argument("--compare", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Median slowdown ratio counted as a regression")
+    parser.add_argument("--quick", action="store_true", help="Fewer runs and no 1M-row table")
+    parser.add_argument("--only", help="Comma-separated suites to run (default: all)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    selected = args.only.split(",") if args.only else list(SUITES)
+    document = {"environment": environment(), "quick": args.quick, "results": {}}
+    for suite in selected:
+        full, quick = SUITES[suite]
+        results = quick() if args.quick else full()
+        document["results"][suite] = results
+        print_results(suite, results)
+
+    write_json(args.out, document)
+    print(f"\n✅ Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("quick") != args.quick:
+            print("⚠️ Baseline and current run used different --quick settings")
+        if compare(document, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
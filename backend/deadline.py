@@ -0,0 +1,72 @@
+"""
+Per-request latency budget
+The deadline lives in a context variable, so it follows the request into
+every coroutine and task it starts (tasks copy the context when created).
+Each stage awaits its work through within(), which cancels the work when the
+budget runs out
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() deadline for the current request, if any
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage runs past the request's latency budget"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+def set_budget(seconds: Optional[float]):
+    """Start the budget for the current request (None or <= 0 disables it)"""
+    _deadline.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget, or None if there is no deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def clamp(timeout: Optional[float]) -> Optional[float]:
+    """The smaller of `timeout` and the remaining budget"""
+    left = remaining()
+    if left is None:
+        return timeout
+    return left if timeout is None else min(timeout, left)
+
+
+async def within(awaitable: Awaitable[T], stage: str) -> T:
+    """
+    Await `awaitable`, cancelling it if the request's budget runs out first
+
+    Args:
+        awaitable: The stage's work
+        stage: Stage name for the error message and logs
+
+    Raises:
+        DeadlineExceeded: If the budget was exhausted
+    """
+    left = remaining()
+    if left is None:
+        return await awaitable
+    if left <= 0:
+        # Close un-started coroutines so they don't warn about never being awaited
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(stage)
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError:
+        if remaining() == 0:
+            raise DeadlineExceeded(stage)
+        raise
@@ -0,0 +1,335 @@
+"""
+Overload protection for Gemini calls
+An AIMD concurrency limit, jittered exponential backoff and a circuit breaker
+shared by every request, so an upstream brownout sheds load quickly instead
+of piling retries onto a struggling API
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import deadline
+
+logger = logging.getLogger(__name__)
+
+# Substrings identifying overload/rate-limit errors from the Gemini SDK
+OVERLOAD_MARKERS = ("503", "429", "overloaded", "unavailable", "resource_exhausted", "resource exhausted", "rate limit")
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling Gemini while it is unhealthy or saturated"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_overload_error(error: Exception) -> bool:
+    """Whether an exception means Gemini is overloaded or rate limiting us"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    # google.api_core exceptions carry the HTTP status as .code
+    if getattr(error, "code", None) in (429, 503):
+        return True
+    error_str = str(error).lower()
+    return any(marker in error_str for marker in OVERLOAD_MARKERS)
+
+
+class AIMDLimiter:
+    """
+    Concurrency cap that grows by ~1 per window of successful calls and
+    halves on every overload signal (additive increase, multiplicative decrease)
+
+    The cap is only engaged once Gemini has signalled overload: until then
+    calls go straight through, so a cold process serves a burst of healthy
+    traffic in parallel. The first overload sets the cap to half the calls
+    then in flight; it is lifted again once it grows back to `max_limit`.
+    """
+
+    def __init__(self, min_limit: int = 1, max_limit: int = 16):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.engaged = False
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created lazily so it binds to the running event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _has_slot(self) -> bool:
+        return not self.engaged or self.in_flight < int(self.limit)
+
+    async def acquire(self, timeout: Optional[float]) -> bool:
+        """
+        Wait for a free slot
+
+        Args:
+            timeout: Max seconds to wait, or None to wait as long as it takes
+
+        Returns:
+            bool: False if no slot freed up within `timeout` seconds
+        """
+        if self._has_slot():
+            self.in_flight += 1
+            return True
+        condition = self._get_condition()
+        async with condition:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(condition.wait_for(self._has_slot), timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            return True
+
+    async def release(self):
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def on_success(self):
+        if not self.engaged:
+            return
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        if self.limit >= self.max_limit:
+            logger.info("🚦 Gemini concurrency recovered to %d, lifting the cap", self.max_limit)
+            self.engaged = False
+
+    def on_overload(self):
+        if not self.engaged:
+            # Back off from the concurrency that actually triggered the overload
+            self.engaged = True
+            self.limit = float(max(self.min_limit, min(self.in_flight, self.max_limit) / 2))
+            logger.info("🚦 Gemini overloaded at %d calls in flight, capping concurrency at %d", self.in_flight, int(self.limit))
+            return
+        self.limit = max(self.min_limit, self.limit / 2)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive overload failures and fails
+    calls fast for `cooldown` seconds. Then a single probe is let through
+    (half-open): success closes the breaker, failure re-opens it with the
+    cooldown doubled up to `max_cooldown`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 15.0, max_cooldown: float = 120.0):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.transitions = {self.CLOSED: 0, self.OPEN: 0, self.HALF_OPEN: 0}
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.info("🔌 Gemini circuit breaker: %s -> %s", self.state, state)
+            self.state = state
+            self.transitions[state] += 1
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will let a probe through"""
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now"""
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                return False
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+        self.cooldown = self.base_cooldown
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            self._open()
+        elif self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def release_probe(self):
+        """Free the half-open probe slot after a call that said nothing about upstream health"""
+        self._probe_in_flight = False
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._set_state(self.OPEN)
+
+
+class GeminiLimiter:
+    """Runs Gemini calls through the breaker, the AIMD limit and a retry loop"""
+
+    def __init__(
+        self,
+        limiter: AIMDLimiter,
+        breaker: CircuitBreaker,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 8.0,
+        queue_timeout: float = 10.0
+    ):
+        """
+        Args:
+            limiter: Concurrency cap shared by all calls
+            breaker: Circuit breaker shared by all calls
+            max_retries: Attempts per call for overload errors
+            backoff_base: First backoff in seconds, doubled per retry
+            backoff_max: Backoff ceiling in seconds
+            queue_timeout: Max seconds to wait for a concurrency slot when the
+                call has no request deadline (with one, the deadline bounds the wait)
+        """
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.counters = {
+            "calls": 0,
+            "successes": 0,
+            "overloads": 0,
+            "errors": 0,
+            "retries": 0,
+            "rejected_open": 0,
+            "shed_queue_timeout": 0,
+        }
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Call `fn` (one Gemini request) with overload protection
+
+        Overload errors are retried with full-jitter exponential backoff;
+        any other error is raised straight away.
+
+        Raises:
+            UpstreamUnavailable: The breaker is open, no slot freed up in
+                time, or every attempt was rejected as overloaded
+        """
+        self.counters["calls"] += 1
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.max_retries):
+            if not self.breaker.allow():
+                self.counters["rejected_open"] += 1
+                raise UpstreamUnavailable(
+                    "Gemini is temporarily unavailable, please try again shortly",
+                    retry_after=max(1.0, self.breaker.retry_after())
+                )
+
+            # Only waits while the cap is engaged, i.e. after Gemini has signalled overload
+            left = deadline.remaining()
+            if not await self.limiter.acquire(self.queue_timeout if left is None else left):
+                self.breaker.release_probe()
+                if deadline.remaining() == 0:
+                    raise deadline.DeadlineExceeded("Gemini queue")
+                self.counters["shed_queue_timeout"] += 1
+                raise UpstreamUnavailable(
+                    "Too many analyses in progress, please try again shortly",
+                    retry_after=self.backoff_max
+                )
+
+            try:
+                result = await fn()
+            except Exception as e:
+                if not is_overload_error(e):
+                    self.counters["errors"] += 1
+                    self.breaker.release_probe()
+                    raise
+                last_error = e
+                self.counters["overloads"] += 1
+                self.limiter.on_overload()
+                self.breaker.record_failure()
+            except BaseException:
+                # Cancelled mid-call: free the probe slot so the breaker can't wedge half-open
+                self.breaker.release_probe()
+                raise
+            else:
+                self.counters["successes"] += 1
+                self.limiter.on_success()
+                self.breaker.record_success()
+                return result
+            finally:
+                await self.limiter.release()
+
+            if attempt < self.max_retries - 1:
+                wait_time = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                left = deadline.remaining()
+                if left is not None and wait_time >= left:
+                    # No budget left for another attempt
+                    break
+                logger.warning("⚠️ Gemini API overloaded (%s), retrying in %.1fs...", last_error, wait_time)
+                self.counters["retries"] += 1
+                await asyncio.sleep(wait_time)
+
+        raise UpstreamUnavailable(
+            f"Gemini is overloaded after {attempt + 1} attempts: {last_error}",
+            retry_after=max(1.0, self.breaker.retry_after() or self.backoff_max)
+        )
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "state": self.breaker.state,
+            "state_transitions": dict(self.breaker.transitions),
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "retry_after": round(self.breaker.retry_after(), 1) if self.breaker.state == CircuitBreaker.OPEN else 0,
+            "concurrency_capped": self.limiter.engaged,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "waiting": self.limiter.waiting,
+        }
+
+
+def create_gemini_limiter() -> GeminiLimiter:
+    """
+    Build the Gemini limiter from environment settings
+
+    GEMINI_CONCURRENCY_MIN / _MAX: AIMD concurrency limit once overload is seen (default 1 / 16)
+    GEMINI_QUEUE_TIMEOUT: Max seconds to wait for a slot outside a request deadline (default 10)
+    GEMINI_MAX_RETRIES: Attempts per call on overload (default 3)
+    GEMINI_BREAKER_THRESHOLD: Consecutive overloads that open the breaker (default 5)
+    GEMINI_BREAKER_COOLDOWN: Seconds the breaker stays open before probing (default 15)
+    """
+    limiter = AIMDLimiter(
+        min_limit=int(os.getenv("GEMINI_CONCURRENCY_MIN", 1)),
+        max_limit=int(os.getenv("GEMINI_CONCURRENCY_MAX", 16))
+    )
+    breaker = CircuitBreaker(
+        failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", 5)),
+        cooldown=float(os.getenv("GEMINI_BREAKER_COOLDOWN", 15))
+    )
+    return GeminiLimiter(
+        limiter,
+        breaker,
+        max_retries=int(os.getenv("GEMINI_MAX_RETRIES", 3)),
+        queue_timeout=float(os.getenv("GEMINI_QUEUE_TIMEOUT", 10))
+    )
@@ -0,0 +1,127 @@
+"""
+Hedged requests
+If a call is still running after the observed p95 latency, a second
+identical call is sent and whichever finishes first wins. Hedges are capped
+at a fraction of all calls so a slow upstream never sees more than a few
+percent extra load. No hedges are sent while the caller reports the
+upstream as overloaded
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from metrics import percentile
+
+
+class Hedger:
+    """Sends a backup call when the first one runs past the latency percentile"""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 0.95,
+        budget_ratio: float = 0.05,
+        min_samples: int = 20,
+        min_delay: float = 0.5,
+        overloaded: Optional[Callable[[], bool]] = None
+    ):
+        """
+        Args:
+            enabled: Whether to hedge at all (latencies are tracked either way)
+            percentile: Latency percentile after which the backup call is sent
+            budget_ratio: Max hedged calls as a fraction of all calls
+            min_samples: Latencies to observe before hedging starts
+            min_delay: Never hedge sooner than this many seconds
+            overloaded: Returns True while upstream is signalling overload; hedges
+                would be extra load the caller's concurrency limit doesn't see
+        """
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.overloaded = overloaded
+        self._latencies = deque(maxlen=500)
+        self.counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "skipped_budget": 0, "skipped_overload": 0}
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None until enough latencies are known"""
+        if len(self._latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, percentile(sorted(self._latencies), self.percentile))
+
+    def _budget_allows(self) -> bool:
+        return self.counters["hedged"] < self.budget_ratio * self.counters["calls"]
+
+    def _record(self, start: float):
+        self._latencies.append(time.perf_counter() - start)
+
+    async def run(self, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `make_call`, hedging it with a second call if it is slow
+
+        Args:
+            make_call: Starts one attempt (called once, or twice when hedging)
+
+        Returns:
+            The result of the first attempt to succeed; if both fail, the
+            primary's exception is raised
+
+        Only the primary attempt's latency is recorded. When the hedge wins,
+        the primary's elapsed time so far is recorded instead (it took at
+        least that long), so hedging doesn't pull the percentile down.
+        """
+        self.counters["calls"] += 1
+        start = time.perf_counter()
+        delay = self.hedge_delay() if self.enabled else None
+        if delay is None:
+            result = await make_call()
+            self._record(start)
+            return result
+
+        primary = asyncio.create_task(make_call())
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                result = primary.result()
+                self._record(start)
+                return result
+
+            skipped = None
+            if self.overloaded is not None and self.overloaded():
+                skipped = "skipped_overload"
+            elif not self._budget_allows():
+                skipped = "skipped_budget"
+            if skipped:
+                self.counters[skipped] += 1
+                result = await primary
+                self._record(start)
+                return result
+
+            self.counters["hedged"] += 1
+            hedge = asyncio.create_task(make_call())
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.counters["hedge_wins"] += 1
+                        self._record(start)
+                        return task.result()
+            # Both attempts failed
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict:
+        delay = self.hedge_delay()
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "hedge_delay": round(delay, 3) if delay is not None else None,
+            "samples": len(self._latencies),
+        }
@@ -0,0 +1,160 @@
+"""
+Shared outbound HTTP connection pool
+One sync and one async httpx client per process, handed to both Supabase
+clients (Storage, PostgREST, Auth) and used for plain image downloads, so
+every outbound call reuses warm keep-alive connections under one set of
+pool limits and per-phase timeouts
+"""
+import logging
+import os
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """HTTP transport that reports requests, new connections and errors to its pool"""
+
+    def __init__(self, pool: "HttpPool", **kwargs):
+        super().__init__(**kwargs)
+        self.http_pool = pool
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.http_pool.counters["requests"] += 1
+        request.extensions.setdefault("trace", self.http_pool.trace)
+        try:
+            return super().handle_request(request)
+        except httpx.TransportError:
+            self.http_pool.counters["transport_errors"] += 1
+            raise
+
+
+class _CountingAsyncTransport(httpx.AsyncHTTPTransport):
+    """Async twin of _CountingTransport"""
+
+    def __init__(self, pool: "HttpPool", **kwargs):
+        super().__init__(**kwargs)
+        self.http_pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.http_pool.counters["requests"] += 1
+        request.extensions.setdefault("trace", self.http_pool.atrace)
+        try:
+            return await super().handle_async_request(request)
+        except httpx.TransportError:
+            self.http_pool.counters["transport_errors"] += 1
+            raise
+
+
+class HttpPool:
+    """
+    Process-wide sync and async httpx clients with shared settings
+
+    The sync client exists from construction (the sync Supabase client is
+    built at import time); the async one is opened inside the event loop by
+    open_async() and closed by aclose().
+    """
+
+    def __init__(self, limits: httpx.Limits, timeout: httpx.Timeout, http2: bool = True):
+        """
+        Args:
+            limits: Max connections and keep-alive connections, per client
+            timeout: Connect/read/write/pool timeouts for every request
+            http2: Negotiate HTTP/2 where the server supports it (needs the h2 package)
+        """
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("⚠️ HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+        self.limits = limits
+        self.timeout = timeout
+        self.http2 = http2
+        self.counters = {
+            "requests": 0,
+            "connections_opened": 0,
+            "transport_errors": 0,
+        }
+        self.sync_client = httpx.Client(
+            transport=_CountingTransport(self, limits=limits, http2=http2),
+            timeout=timeout,
+            follow_redirects=True
+        )
+        self.async_client: Optional[httpx.AsyncClient] = None
+
+    def open_async(self) -> httpx.AsyncClient:
+        """Create the async client (call from the running event loop)"""
+        self.async_client = httpx.AsyncClient(
+            transport=_CountingAsyncTransport(self, limits=self.limits, http2=self.http2),
+            timeout=self.timeout,
+            follow_redirects=True
+        )
+        return self.async_client
+
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.aclose()
+            self.async_client = None
+
+    def close(self):
+        self.sync_client.close()
+
+    def _on_trace(self, event: str):
+        # httpcore reports each phase; a completed TCP connect is a new pooled connection
+        if event == "connection.connect_tcp.complete":
+            self.counters["connections_opened"] += 1
+
+    def trace(self, event: str, info: Dict):
+        self._on_trace(event)
+
+    async def atrace(self, event: str, info: Dict):
+        self._on_trace(event)
+
+    def stats(self) -> Dict:
+        connections = {"active": 0, "idle": 0}
+        for client in (self.sync_client, self.async_client):
+            # httpx keeps the httpcore connection pool on its transport
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            for connection in getattr(pool, "connections", ()):
+                connections["idle" if connection.is_idle() else "active"] += 1
+        requests = self.counters["requests"]
+        return {
+            **self.counters,
+            "connections": connections,
+            # Share of requests that went out on an already open connection
+            "reuse_ratio": round(1 - self.counters["connections_opened"] / requests, 4) if requests else 0.0,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+        }
+
+
+def create_http_pool() -> HttpPool:
+    """
+    Build the shared HTTP pool from environment settings
+
+    HTTP_MAX_CONNECTIONS: Open connections per client, across all hosts (default 100)
+    HTTP_MAX_KEEPALIVE: Idle connections kept for reuse (default 20)
+    HTTP_KEEPALIVE_EXPIRY: Seconds an idle connection is kept (default 30)
+    HTTP2: "1" (default) to negotiate HTTP/2, "0" for HTTP/1.1 only
+    HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT / HTTP_WRITE_TIMEOUT: Per-phase timeouts in seconds (default 5 / 30 / 30)
+    HTTP_POOL_TIMEOUT: Max seconds to wait for a free connection (default 10)
+    """
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", 100)),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", 20)),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+    )
+    timeout = httpx.Timeout(
+        connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", 5)),
+        read=float(os.getenv("HTTP_READ_TIMEOUT", 30)),
+        write=float(os.getenv("HTTP_WRITE_TIMEOUT", 30)),
+        pool=float(os.getenv("HTTP_POOL_TIMEOUT", 10))
+    )
+    return HttpPool(limits, timeout, http2=os.getenv("HTTP2", "1") == "1")
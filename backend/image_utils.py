@@ -0,0 +1,130 @@
+"""
+Image helpers shared by the upload and analysis paths
+"""
+import io
+import os
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+
+# (offset, signature, MIME type) checked against the first bytes of a file
+IMAGE_SIGNATURES = [
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (8, b"WEBP", "image/webp"),  # RIFF container, checked together with the RIFF tag below
+    (4, b"ftypheic", "image/heic"),
+    (4, b"ftypheix", "image/heic"),
+    (4, b"ftypmif1", "image/heif"),
+]
+
+# Enough bytes to identify every signature above
+SNIFF_BYTES = 16
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """
+    Detect the image type from its leading bytes instead of trusting the client
+
+    Args:
+        head: At least the first SNIFF_BYTES bytes of the file
+
+    Returns:
+        str: MIME type, or None if the bytes are not a supported image
+    """
+    for offset, signature, mime_type in IMAGE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if mime_type == "image/webp" and not head.startswith(b"RIFF"):
+                continue
+            return mime_type
+    return None
+
+
+def get_normalize_config() -> Dict:
+    """
+    Screenshot normalization settings from the environment
+
+    SCREENSHOT_NORMALIZE: 1 to enable (default), 0 to send raw bytes
+    SCREENSHOT_MAX_EDGE: Max long edge in pixels (default 1600)
+    SCREENSHOT_FORMAT: webp (default), jpeg or png
+    SCREENSHOT_QUALITY: Encoder quality for webp/jpeg (default 80)
+    SCREENSHOT_COLOR: rgb (default), grayscale or palette. Chat apps tell
+        speakers apart by bubble colour, so grayscale is opt-in only;
+        palette only applies to png output
+    """
+    return {
+        "enabled": os.getenv("SCREENSHOT_NORMALIZE", "1") == "1",
+        "max_long_edge": int(os.getenv("SCREENSHOT_MAX_EDGE", 1600)),
+        "format": os.getenv("SCREENSHOT_FORMAT", "webp").lower(),
+        "quality": int(os.getenv("SCREENSHOT_QUALITY", 80)),
+        "color": os.getenv("SCREENSHOT_COLOR", "rgb").lower(),
+    }
+
+
+def normalize_screenshot(
+    contents: bytes,
+    max_long_edge: int = 1600,
+    output_format: str = "webp",
+    quality: int = 80,
+    color: str = "rgb"
+) -> Tuple[bytes, str]:
+    """
+    Shrink a screenshot before it is sent to Gemini
+
+    Applies EXIF orientation, downscales so the long edge is at most
+    max_long_edge, converts colour mode and re-encodes without metadata.
+    If the re-encoded image is not smaller, the original is returned.
+
+    Args:
+        contents: Raw image bytes
+        max_long_edge: Max size of the longer side in pixels
+        output_format: "webp", "jpeg" or "png"
+        quality: Encoder quality for lossy formats
+        color: "rgb", "grayscale" or "palette"
+
+    Returns:
+        Tuple of (image bytes, MIME type)
+    """
+    with Image.open(io.BytesIO(contents)) as original:
+        original_mime = Image.MIME.get(original.format, "image/jpeg")
+        img = ImageOps.exif_transpose(original)
+
+        # Downscale to the configured long edge
+        long_edge = max(img.size)
+        if long_edge > max_long_edge:
+            scale = max_long_edge / long_edge
+            new_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(new_size, Image.Resampling.LANCZOS)
+
+        # Flatten transparency onto white so text stays readable
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img.convert("RGBA"), mask=img.convert("RGBA").split()[-1])
+            img = background
+
+        if color == "grayscale":
+            img = img.convert("L")
+        elif color == "palette" and output_format == "png":
+            img = img.convert("RGB").quantize(colors=64)
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        # Re-encoding without exif/icc_profile strips all metadata
+        output = io.BytesIO()
+        if output_format == "png":
+            img.save(output, format="PNG", optimize=True)
+            mime_type = "image/png"
+        elif output_format == "jpeg":
+            img.save(output, format="JPEG", quality=quality, optimize=True)
+            mime_type = "image/jpeg"
+        else:
+            # method=2 is within ~3% of the best size at under half the encode time
+            img.save(output, format="WEBP", quality=quality, method=2)
+            mime_type = "image/webp"
+
+    normalized = output.getvalue()
+    if len(normalized) >= len(contents):
+        return contents, original_mime
+    return normalized, mime_type
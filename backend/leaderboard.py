@@ -0,0 +1,349 @@
+"""
+In-process materialized leaderboard
+Per-nickname sum/count aggregates for each time window are seeded once from
+the scores table, updated incrementally from the score write path and
+periodically reconciled with the database, so reads never scan the table
+"""
+import asyncio
+import base64
+import json
+import logging
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Calendar windows in UTC: "daily" is today, "weekly" is the current ISO week
+WINDOWS = ("all", "daily", "weekly")
+
+# Seconds between attempts while the initial seed keeps failing
+SEED_RETRY_SECONDS = 5.0
+
+
+def _sort_key(nickname: str, total: int, count: int) -> Tuple[float, int, str]:
+    """Highest average first, then most scores, then nickname"""
+    return (-total / count, -count, nickname)
+
+
+def window_bucket(window: str, when: datetime) -> str:
+    """Identify the bucket of `window` that `when` falls into"""
+    if window == "daily":
+        return when.strftime("%Y-%m-%d")
+    if window == "weekly":
+        year, week, _ = when.isocalendar()
+        return f"{year}-W{week:02d}"
+    return "all"
+
+
+def _row_time(row: Dict) -> datetime:
+    """created_at of a score row, or now for rows that haven't round-tripped the database"""
+    created_at = row.get("created_at")
+    if created_at:
+        try:
+            parsed = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        except (TypeError, ValueError):
+            pass
+    return datetime.now(timezone.utc)
+
+
+def encode_cursor(window: str, key: Tuple[float, int, str]) -> str:
+    """Opaque cursor pointing just after `key` in `window`"""
+    payload = json.dumps([window, *key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, window: str) -> Tuple[float, int, str]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another window
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_window, neg_avg, neg_count, nickname = json.loads(base64.urlsafe_b64decode(padded))
+        key = (float(neg_avg), int(neg_count), str(nickname))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_window != window:
+        raise ValueError(f"Cursor belongs to the {cursor_window} window")
+    return key
+
+
+class LeaderboardAggregate:
+    """
+    Per-nickname sum/count plus an index kept sorted by rank
+
+    Updates are O(log N) to locate plus a list shift; reading the top K
+    entries is a slice of the index.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, List[int]] = {}
+        self._index: List[Tuple[float, int, str]] = []
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict]) -> "LeaderboardAggregate":
+        """Build an aggregate from score rows in one pass"""
+        aggregate = cls()
+        for row in rows:
+            aggregate._accumulate(row.get("nickname"), row.get("rizz_score") or 0)
+        aggregate._reindex()
+        return aggregate
+
+    def _accumulate(self, nickname: str, score: int):
+        """Add to the totals without touching the index (bulk loads call _reindex after)"""
+        totals = self.totals.setdefault(nickname or "Anonymous", [0, 0])
+        totals[0] += score
+        totals[1] += 1
+
+    def _reindex(self):
+        self._index = sorted(
+            _sort_key(nickname, total, count) for nickname, (total, count) in self.totals.items()
+        )
+
+    def add(self, nickname: str, score: int):
+        """Fold one new score into the aggregate"""
+        nickname = nickname or "Anonymous"
+        totals = self.totals.get(nickname)
+        if totals is None:
+            totals = self.totals[nickname] = [0, 0]
+        else:
+            old_key = _sort_key(nickname, totals[0], totals[1])
+            position = bisect_left(self._index, old_key)
+            if position < len(self._index) and self._index[position] == old_key:
+                del self._index[position]
+        totals[0] += score
+        totals[1] += 1
+        insort(self._index, _sort_key(nickname, totals[0], totals[1]))
+
+    def page(
+        self,
+        limit: int = 10,
+        after: Optional[Tuple[float, int, str]] = None
+    ) -> Tuple[List[Dict], Optional[Tuple[float, int, str]]]:
+        """
+        One page of entries in rank order
+
+        Pages are keyset-based: `after` is the sort key of the last entry
+        already seen, so entries moving around between requests never cause
+        a page to repeat or skip the entries that didn't move.
+
+        Args:
+            limit: Max entries to return
+            after: Sort key of the previous page's last entry, or None for the first page
+
+        Returns:
+            Tuple of (entries, sort key to pass as `after` for the next page or None)
+        """
+        start = bisect_right(self._index, after) if after is not None else 0
+        keys = self._index[start:start + limit]
+        entries = []
+        for offset, (neg_avg, neg_count, nickname) in enumerate(keys):
+            entries.append({
+                "rank": start + offset + 1,
+                "nickname": nickname,
+                "avg_rizz": round(-neg_avg),
+                "total_scores": -neg_count
+            })
+        next_key = keys[-1] if keys and start + limit < len(self._index) else None
+        return entries, next_key
+
+    def top(self, limit: int = 10) -> List[Dict]:
+        """Top entries in the shape the /leaderboard/ endpoint returns"""
+        return self.page(limit)[0]
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+Windows = Dict[str, Tuple[str, LeaderboardAggregate]]
+
+
+def build_windows(rows: Iterable[Dict], now: Optional[datetime] = None) -> Windows:
+    """
+    Build the aggregate for the current bucket of every window in one pass
+
+    Returns:
+        Dict of window -> (bucket id, aggregate)
+    """
+    now = now or datetime.now(timezone.utc)
+    windows = {window: (window_bucket(window, now), LeaderboardAggregate()) for window in WINDOWS}
+    for row in rows:
+        when = None
+        for window, (bucket, aggregate) in windows.items():
+            if window != "all":
+                when = when or _row_time(row)
+                if window_bucket(window, when) != bucket:
+                    continue
+            aggregate._accumulate(row.get("nickname"), row.get("rizz_score") or 0)
+    for _, aggregate in windows.values():
+        aggregate._reindex()
+    return windows
+
+
+def _build_with_ids(rows: List[Dict]) -> Tuple[Windows, set]:
+    """
+    build_windows plus the ids of the rows it counted (runs in a worker thread)
+
+    A row read twice by the paged load is only counted once.
+    """
+    ids = set()
+    unique = []
+    for row in rows:
+        row_id = row.get("id")
+        if row_id is not None:
+            if row_id in ids:
+                continue
+            ids.add(row_id)
+        unique.append(row)
+    return build_windows(unique), ids
+
+
+class MaterializedLeaderboard:
+    """Keeps a LeaderboardAggregate per window seeded, updated and reconciled"""
+
+    def __init__(self, load_rows: Callable[[], Awaitable[List[Dict]]], reconcile_interval: float = 300.0):
+        """
+        Args:
+            load_rows: Coroutine function returning every score row (id, nickname, rizz_score, created_at)
+            reconcile_interval: Seconds between full rebuilds from the database
+        """
+        self.load_rows = load_rows
+        self.reconcile_interval = reconcile_interval
+        self.windows: Optional[Windows] = None
+        # One buffer per running reconcile: rows recorded while it loads/rebuilds, replayed onto its windows
+        self._reconcile_buffers: List[List[Dict]] = []
+        self._seeded: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "reconciles": 0,
+            "reconcile_failures": 0,
+            "incremental_updates": 0,
+            "rollovers": 0,
+            "replayed_after_reconcile": 0,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.windows is not None
+
+    @property
+    def aggregate(self) -> Optional[LeaderboardAggregate]:
+        """The all-time aggregate"""
+        return self.windows["all"][1] if self.windows else None
+
+    def _get_seeded(self) -> asyncio.Event:
+        # Created lazily so it binds to the running event loop
+        if self._seeded is None:
+            self._seeded = asyncio.Event()
+        return self._seeded
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """
+        Wait for the initial seed (shared by every caller; never starts a scan itself)
+
+        Returns:
+            bool: False if the windows still weren't seeded after `timeout` seconds
+        """
+        if self.ready:
+            return True
+        try:
+            await asyncio.wait_for(self._get_seeded().wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def start(self):
+        """Seed in the background and reconcile periodically (call from a running event loop)"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.warning("⚠️ Leaderboard reconcile failed: %s", e)
+                self.counters["reconcile_failures"] += 1
+            await asyncio.sleep(self.reconcile_interval if self.ready else min(self.reconcile_interval, SEED_RETRY_SECONDS))
+
+    async def reconcile(self):
+        """
+        Rebuild every window from the database and swap them in
+
+        Scores recorded while the table is being read and aggregated are
+        kept and applied to the rebuilt windows, unless their id shows the
+        reload already counted them.
+        """
+        recorded: List[Dict] = []
+        self._reconcile_buffers.append(recorded)
+        try:
+            rows = await self.load_rows()
+            # Aggregating a large table takes long enough to stall every request if run on the loop
+            windows, loaded_ids = await asyncio.to_thread(_build_with_ids, rows)
+            replay = [row for row in recorded if row.get("id") not in loaded_ids]
+        finally:
+            self._reconcile_buffers.remove(recorded)
+        self._apply(windows, replay, datetime.now(timezone.utc))
+        self.windows = windows
+        self._get_seeded().set()
+        self.counters["reconciles"] += 1
+        self.counters["replayed_after_reconcile"] += len(replay)
+        logger.info("✅ Leaderboard materialized: %s nicknames from %s scores", len(self.aggregate), len(rows))
+
+    def _current(self, windows: Windows, window: str, now: datetime) -> LeaderboardAggregate:
+        """Aggregate for the current bucket of `window`, starting a fresh one when the bucket rolls over"""
+        bucket, aggregate = windows[window]
+        current = window_bucket(window, now)
+        if bucket != current:
+            aggregate = LeaderboardAggregate()
+            windows[window] = (current, aggregate)
+            self.counters["rollovers"] += 1
+        return aggregate
+
+    def _apply(self, windows: Windows, rows: Iterable[Dict], now: datetime):
+        for row in rows:
+            when = _row_time(row)
+            for window in WINDOWS:
+                aggregate = self._current(windows, window, now)
+                if window_bucket(window, when) == window_bucket(window, now):
+                    aggregate.add(row.get("nickname"), row.get("rizz_score") or 0)
+
+    def record(self, rows: Iterable[Dict]):
+        """Apply newly written score rows (called after each successful batch insert)"""
+        rows = list(rows)
+        for recorded in self._reconcile_buffers:
+            recorded.extend(rows)
+        if self.windows is None:
+            return
+        self._apply(self.windows, rows, datetime.now(timezone.utc))
+        self.counters["incremental_updates"] += len(rows)
+
+    def page(
+        self,
+        window: str = "all",
+        limit: int = 10,
+        after: Optional[Tuple[float, int, str]] = None
+    ) -> Tuple[List[Dict], Optional[Tuple[float, int, str]]]:
+        """One page of `window` (see LeaderboardAggregate.page)"""
+        if self.windows is None:
+            return [], None
+        return self._current(self.windows, window, datetime.now(timezone.utc)).page(limit, after)
+
+    def top(self, limit: int = 10) -> List[Dict]:
+        return self.page("all", limit)[0]
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "ready": self.ready,
+            "nicknames": {window: len(aggregate) for window, (_, aggregate) in self.windows.items()} if self.windows else {},
+        }
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Closed-loop load test of the upload -> calculate -> leaderboard user flow.
+
+Starts the stand-ins (standins.py) and one app process (serve_app.py), then
+runs --users virtual users, each repeating the flow the frontend drives:
+POST /upload_screenshot/, POST /calculate_rizz/ with the returned URL, then
+GET /leaderboard/. With --rps, flow starts are paced to that rate across all
+users (users still wait for their previous flow, so an overloaded app shows
+up as a lower achieved rate rather than an unbounded queue).
+
+Reports p50/p95/p99 latency, throughput and error rate per endpoint, and
+writes them as JSON with --json.
+
+Usage:
+    python loadtest/run_load.py [--users 20] [--rps 5] [--duration 60] [--warmup 10]
+                                [--profile realistic] [--set gemini.error_rate=0.1]
+                                [--unique-ratio 0.5] [--json results.json]
+    python loadtest/run_load.py --target http://127.0.0.1:8000 ...   # reuse a running app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(LOADTEST_DIR)
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+TEST_IMAGE = os.path.join(REPO_DIR, "tests", "test1.jpeg")
+
+sys.path.insert(0, BACKEND_DIR)
+from metrics import percentile  # noqa: E402  (needs backend/ on sys.path)
+
+ENDPOINTS = ("upload_screenshot", "calculate_rizz", "leaderboard")
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint for requests started inside the measured window"""
+
+    def __init__(self, window_start: float, window_end: float):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Counter] = defaultdict(Counter)
+        self.flows = 0
+
+    def record(self, endpoint: str, started: float, outcome: str):
+        if not self.window_start <= started < self.window_end:
+            return
+        self.latencies[endpoint].append((time.perf_counter() - started) * 1000)
+        self.outcomes[endpoint][outcome] += 1
+
+    def flow_done(self, started: float):
+        if self.window_start <= started < self.window_end:
+            self.flows += 1
+
+    def report(self, elapsed: float) -> Dict:
+        """Per-endpoint percentiles, throughput and error rate over `elapsed` measured seconds"""
+        endpoints = {}
+        for endpoint in ENDPOINTS:
+            ordered = sorted(self.latencies[endpoint])
+            outcomes = self.outcomes[endpoint]
+            total = sum(outcomes.values())
+            errors = sum(count for outcome, count in outcomes.items() if not outcome.startswith("2"))
+            endpoints[endpoint] = {
+                "requests": total,
+                "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "p50_ms": percentile(ordered, 0.50, 1),
+                "p95_ms": percentile(ordered, 0.95, 1),
+                "p99_ms": percentile(ordered, 0.99, 1),
+                "max_ms": percentile(ordered, 1.0, 1),
+                "outcomes": dict(outcomes),
+            }
+        return {
+            "measured_seconds": round(elapsed, 2),
+            "flows": self.flows,
+            "flows_per_second": round(self.flows / elapsed, 3) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+class Pacer:
+    """Hands out flow start times `1 / rps` apart, shared by all users"""
+
+    def __init__(self, rps: Optional[float]):
+        self.interval = 1 / rps if rps else 0.0
+        self.next_start = time.perf_counter()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.perf_counter()
+        # A user that fell behind doesn't get to burst to catch up
+        start = max(self.next_start, now)
+        self.next_start = start + self.interval
+        await asyncio.sleep(start - now)
+
+
+async def timed(recorder: Recorder, endpoint: str, request) -> Optional[httpx.Response]:
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError as e:
+        recorder.record(endpoint, started, f"error:{type(e).__name__}")
+        return None
+    recorder.record(endpoint, started, str(response.status_code))
+    return response
+
+
+async def user_flow(client: httpx.AsyncClient, user_id: int, image: bytes, unique_ratio: float, recorder: Recorder, rng: random.Random):
+    """One pass through the frontend flow; later steps are skipped if an earlier one failed"""
+    started = time.perf_counter()
+    # Bytes after the JPEG end marker don't change the image but give it a new content hash
+    contents = image + uuid.uuid4().bytes if rng.random() < unique_ratio else image
+    response = await timed(recorder, "upload_screenshot", client.post(
+        "/upload_screenshot/",
+        files={"file": ("screenshot.jpeg", contents, "image/jpeg")}
+    ))
+    if response is None or response.status_code != 200:
+        return
+
+    response = await timed(recorder, "calculate_rizz", client.post(
+        "/calculate_rizz/",
+        json={"image_url": response.json()["image_url"], "nickname": f"load{user_id % 50}"},
+        headers={"Idempotency-Key": str(uuid.uuid4())}
+    ))
+    if response is None or response.status_code != 200:
+        return
+
+    await timed(recorder, "leaderboard", client.get("/leaderboard/", params={"window": rng.choice(("all", "all", "daily", "weekly"))}))
+    recorder.flow_done(started)
+
+
+async def run_load(target: str, users: int, rps: Optional[float], duration: float, warmup: float, unique_ratio: float, seed: int) -> Dict:
+    with open(TEST_IMAGE, "rb") as f:
+        image = f.read()
+
+    start = time.perf_counter()
+    stop_at = start + warmup + duration
+    recorder = Recorder(start + warmup, stop_at)
+    pacer = Pacer(rps)
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=httpx.Timeout(120.0)) as client:
+
+        async def user(user_id: int):
+            rng = random.Random(seed + user_id)
+            while time.perf_counter() < stop_at:
+                await pacer.wait()
+                if time.perf_counter() >= stop_at:
+                    return
+                await user_flow(client, user_id, image, unique_ratio, recorder, rng)
+
+        await asyncio.gather(*(user(user_id) for user_id in range(users)))
+        stats = (await client.get("/stats/")).json()
+
+    # Rates are over the measured window: requests that started in it, however long they took
+    report = recorder.report(duration)
+    report["app_stats"] = stats
+    return report
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode} before it was ready")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def print_report(report: Dict, settings: Dict):
+    print(f"\n📊 {settings['users']} users, target {settings['rps'] or 'unpaced'} flows/s, profile {settings['profile']}")
+    print(f"   {report['flows']} complete flows in {report['measured_seconds']}s ({report['flows_per_second']} flows/s)\n")
+    print(f"   {'endpoint':<20}{'reqs':>7}{'rps':>9}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in report["endpoints"].items():
+        cells = [f"{stats[key]:>10.1f}" if stats[key] is not None else f"{'-':>10}" for key in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"   {endpoint:<20}{stats['requests']:>7}{stats['throughput_rps']:>9.2f}{stats['error_rate']:>9.2%}{''.join(cells)}")
+        failures = {outcome: count for outcome, count in stats["outcomes"].items() if not outcome.startswith("2")}
+        if failures:
+            print(f"   {'':<20}failures: {failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--rps", type=float, help="Target flow starts per second across all users (default: unpaced)")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="Seconds of load before measuring")
+    parser.add_argument("--unique-ratio", type=float, default=0.5,
+                        help="Fraction of uploads with new bytes (the rest hit the dedupe and analysis caches)")
+    parser.add_argument("--profile", default="realistic", help="Stand-in latency/error profile (see standins.py)")
+    parser.add_argument("--set", action="append", default=[], metavar="SERVICE.KEY=VALUE", help="Override a profile setting")
+    parser.add_argument("--seed-scores", type=int, default=1000, help="Score rows in the stand-in database at startup")
+    parser.add_argument("--target", help="Load an already running app at this URL instead of starting one")
+    parser.add_argument("--port", type=int, default=8765, help="App port (stand-ins use the next two)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    processes = []
+    target = args.target
+    log_path = os.path.join(LOADTEST_DIR, "loadtest-app.log")
+    try:
+        if target is None:
+            standins_url = f"http://127.0.0.1:{args.port + 1}"
+            processes.append(subprocess.Popen([
+                sys.executable, os.path.join(LOADTEST_DIR, "standins.py"),
+                "--port", str(args.port + 1), "--grpc-port", str(args.port + 2),
+                "--profile", args.profile, "--seed-scores", str(args.seed_scores), "--seed", str(args.seed),
+                *[f"--set={override}" for override in args.set],
+            ]))
+            wait_until_up(f"{standins_url}/health", processes[-1])
+
+            with open(log_path, "w") as log:
+                processes.append(subprocess.Popen([
+                    sys.executable, os.path.join(LOADTEST_DIR, "serve_app.py"),
+                    "--port", str(args.port), "--standins", standins_url, "--gemini", f"127.0.0.1:{args.port + 2}",
+                ], stdout=log, stderr=subprocess.STDOUT))
+            target = f"http://127.0.0.1:{args.port}"
+            wait_until_up(f"{target}/", processes[-1])
+            print(f"🚀 App on {target} (logs: {log_path})")
+
+        print(f"⏳ {args.warmup:.0f}s warmup + {args.duration:.0f}s measured with {args.users} users...")
+        report = asyncio.run(run_load(target, args.users, args.rps, args.duration, args.warmup, args.unique_ratio, args.seed))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    settings = {key: getattr(args, key) for key in ("users", "rps", "duration", "warmup", "unique_ratio", "profile", "set", "seed_scores")}
+    print_report(report, settings)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": settings, **report}, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the services the backend talks to, for load tests.
+
+One process serves:
+- Supabase Storage (/storage/v1): upload, exists (HEAD), download, list
+- PostgREST (/rest/v1): insert and select on any table (eq/gt filters,
+  order, limit/offset/Range paging), rpc (404, so the app takes its no-RPC
+  path). Ids are random UUIDs, as gen_random_uuid() gives in Supabase
+- Gemini (gRPC GenerativeService.GenerateContent): canned analyses, batch
+  replies with per_image entries and transcripts
+
+Each service sleeps for a latency drawn from a log-normal distribution and
+fails a configurable fraction of calls, per the profile passed in.
+
+Usage:
+    python loadtest/standins.py --port 54321 --grpc-port 54322 [--profile realistic] [--seed-scores N]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import grpc
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from google.ai.generativelanguage_v1beta.types import (
+    Candidate,
+    Content,
+    GenerateContentRequest,
+    GenerateContentResponse,
+    Part,
+)
+
+# Per service: median latency (ms), log-normal spread (sigma) and error rate.
+# Gemini can also answer with unparseable text (malformed_rate).
+PROFILES: Dict[str, Dict[str, Dict[str, float]]] = {
+    "instant": {
+        "storage": {"latency_ms": 0, "sigma": 0.0, "error_rate": 0.0},
+        "rest": {"latency_ms": 0, "sigma": 0.0, "error_rate": 0.0},
+        "gemini": {"latency_ms": 0, "sigma": 0.0, "error_rate": 0.0, "malformed_rate": 0.0},
+    },
+    "realistic": {
+        "storage": {"latency_ms": 60, "sigma": 0.4, "error_rate": 0.0},
+        "rest": {"latency_ms": 25, "sigma": 0.4, "error_rate": 0.0},
+        "gemini": {"latency_ms": 2500, "sigma": 0.35, "error_rate": 0.005, "malformed_rate": 0.01},
+    },
+    "degraded": {
+        "storage": {"latency_ms": 150, "sigma": 0.8, "error_rate": 0.01},
+        "rest": {"latency_ms": 80, "sigma": 0.8, "error_rate": 0.01},
+        "gemini": {"latency_ms": 6000, "sigma": 0.6, "error_rate": 0.1, "malformed_rate": 0.05},
+    },
+}
+
+GEMINI_SERVICE = "google.ai.generativelanguage.v1beta.GenerativeService"
+
+TRANSCRIPT = """Them: hey! did you end up going to that concert?
+Me: I did, the opener was better than the headliner honestly
+Them: no way, who was it
+Me: tell you over coffee? thursday?"""
+
+
+def build_profile(name: str, overrides: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    A named profile with `service.key=value` overrides applied
+
+    Raises:
+        ValueError: For an unknown profile, service or key
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile {name!r} (choose from {', '.join(PROFILES)})")
+    profile = {service: dict(settings) for service, settings in PROFILES[name].items()}
+    for override in overrides or []:
+        target, _, value = override.partition("=")
+        service, _, key = target.partition(".")
+        if service not in profile or key not in profile[service]:
+            raise ValueError(f"Unknown profile setting {target!r}")
+        profile[service][key] = float(value)
+    return profile
+
+
+class Behaviour:
+    """Latency and failure injection for one service"""
+
+    def __init__(self, settings: Dict[str, float], rng: random.Random):
+        self.settings = settings
+        self.rng = rng
+
+    async def delay(self):
+        median = self.settings["latency_ms"] / 1000
+        if median <= 0:
+            return
+        sigma = self.settings["sigma"]
+        await asyncio.sleep(median * math.exp(self.rng.gauss(0, sigma)) if sigma else median)
+
+    def fails(self, key: str = "error_rate") -> bool:
+        return self.rng.random() < self.settings.get(key, 0.0)
+
+
+def synthetic_scores(count: int, rng: random.Random) -> List[Dict]:
+    """Existing score rows so leaderboard reads have a table to aggregate"""
+    now = datetime.now(timezone.utc)
+    nicknames = [f"seed{index}" for index in range(max(10, count // 20))]
+    return [
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "nickname": rng.choice(nicknames),
+            "rizz_score": rng.randint(0, 100),
+            "suggestions": [],
+            "reasoning": "",
+            "created_at": (now - timedelta(seconds=rng.randint(0, 30 * 86400))).isoformat(),
+        }
+        for index in range(count)
+    ]
+
+
+def create_http_app(profile: Dict, rng: random.Random, seed_scores: int = 0) -> FastAPI:
+    """FastAPI app standing in for Supabase Storage and PostgREST"""
+    app = FastAPI()
+    storage = Behaviour(profile["storage"], rng)
+    rest = Behaviour(profile["rest"], rng)
+    objects: Dict[str, tuple] = {}
+    tables: Dict[str, List[Dict]] = {"scores": synthetic_scores(seed_scores, rng)}
+
+    def storage_error(status: int, error: str, message: str) -> JSONResponse:
+        return JSONResponse(status_code=status, content={"statusCode": str(status), "error": error, "message": message})
+
+    # Literal path segments (list, public) are declared before the {bucket} catch-alls
+    @app.post("/storage/v1/object/list/{bucket}")
+    async def list_objects(bucket: str, request: Request):
+        await storage.delay()
+        body = await request.json()
+        prefix = f"{bucket}/{body.get('prefix', '')}".rstrip("/") + "/"
+        names = [key[len(prefix):] for key in objects if key.startswith(prefix)]
+        return [{"name": name, "id": str(uuid.uuid4()), "metadata": {}} for name in names if "/" not in name]
+
+    @app.get("/storage/v1/object/public/{bucket}/{path:path}")
+    @app.api_route("/storage/v1/object/{bucket}/{path:path}", methods=["GET", "HEAD"])
+    async def download_object(bucket: str, path: str, request: Request):
+        await storage.delay()
+        if storage.fails():
+            return storage_error(503, "unavailable", "Stand-in storage error")
+        stored = objects.get(f"{bucket}/{path}")
+        if stored is None:
+            if request.method == "HEAD":
+                return Response(status_code=404)
+            return storage_error(404, "not_found", "Object not found")
+        contents, content_type = stored
+        if request.method == "HEAD":
+            return Response(status_code=200, headers={"content-type": content_type, "content-length": str(len(contents))})
+        return Response(content=contents, media_type=content_type)
+
+    @app.post("/storage/v1/object/{bucket}/{path:path}")
+    async def upload_object(bucket: str, path: str, request: Request):
+        await storage.delay()
+        if storage.fails():
+            return storage_error(503, "unavailable", "Stand-in storage error")
+        key = f"{bucket}/{path}"
+        if key in objects and request.headers.get("x-upsert") != "true":
+            return storage_error(409, "Duplicate", "The resource already exists")
+        form = await request.form()
+        upload = form["file"]
+        objects[key] = (await upload.read(), upload.content_type or "application/octet-stream")
+        return {"Key": key, "Id": str(uuid.uuid4())}
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str):
+        await rest.delay()
+        return JSONResponse(
+            status_code=404,
+            content={"code": "PGRST202", "message": f"Could not find the function public.{function}", "details": None, "hint": None}
+        )
+
+    @app.post("/rest/v1/{table}")
+    async def insert_rows(table: str, request: Request):
+        await rest.delay()
+        if rest.fails():
+            return JSONResponse(status_code=503, content={"message": "Stand-in database error"})
+        payload = await request.json()
+        rows = tables.setdefault(table, [])
+        inserted = []
+        for row in payload if isinstance(payload, list) else [payload]:
+            row = {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc).isoformat(), **row}
+            rows.append(row)
+            inserted.append(row)
+        if "return=representation" in request.headers.get("prefer", ""):
+            return JSONResponse(status_code=201, content=inserted)
+        return Response(status_code=201)
+
+    @app.get("/rest/v1/{table}")
+    async def select_rows(table: str, request: Request):
+        await rest.delay()
+        if rest.fails():
+            return JSONResponse(status_code=503, content={"message": "Stand-in database error"})
+        rows = tables.get(table, [])
+        params = request.query_params
+        for column, condition in params.items():
+            operator, _, value = condition.partition(".")
+            if column in ("select", "order", "offset", "limit") or operator not in ("eq", "gt"):
+                continue
+            if operator == "eq":
+                rows = [row for row in rows if str(row.get(column)) == value]
+            else:
+                rows = [row for row in rows if str(row.get(column)) > value]
+        if "order" in params:
+            column, _, direction = params["order"].partition(".")
+            rows = sorted(rows, key=lambda row: str(row.get(column)), reverse=direction.startswith("desc"))
+        offset = int(params.get("offset", 0))
+        limit = int(params["limit"]) if "limit" in params else None
+        range_header = request.headers.get("range")
+        if range_header and "-" in range_header:
+            first, last = range_header.split("-", 1)
+            offset, limit = int(first), int(last) - int(first) + 1
+        selected = rows[offset:offset + limit if limit is not None else None]
+        columns = [column.strip() for column in params.get("select", "*").split(",")]
+        if columns != ["*"]:
+            selected = [{column: row.get(column) for column in columns} for row in selected]
+        return selected
+
+    @app.get("/health")
+    async def health():
+        return {"objects": len(objects), "rows": {table: len(rows) for table, rows in tables.items()}}
+
+    return app
+
+
+class GeminiStandIn:
+    """GenerateContent handler returning canned, schema-shaped replies"""
+
+    def __init__(self, settings: Dict[str, float], rng: random.Random):
+        self.behaviour = Behaviour(settings, rng)
+        self.rng = rng
+        self.calls = 0
+
+    def reply_text(self, request: GenerateContentRequest) -> str:
+        parts = [part for content in request.contents for part in content.parts]
+        prompt = next((part.text for part in parts if part.text), "")
+        if prompt.startswith("Transcribe the chat"):
+            return TRANSCRIPT
+        if self.behaviour.fails("malformed_rate"):
+            return "Sorry, I can't help rate this conversation."
+        score = self.rng.randint(20, 95)
+        reply = {
+            "score": score,
+            "suggestions": [
+                "Ask an open question about something they mentioned.",
+                "Match their message length instead of double texting.",
+                "Suggest a specific plan instead of a vague maybe.",
+            ],
+            "reasoning": "Solid banter with a clear hook. The close could be more direct.",
+        }
+        screenshots = sum(1 for part in parts if part.text.startswith("Screenshot "))
+        if screenshots:
+            reply["per_image"] = [
+                {"score": max(0, min(100, score + self.rng.randint(-10, 10))), "reasoning": "Stand-in screenshot reply."}
+                for _ in range(screenshots)
+            ]
+        return json.dumps(reply)
+
+    async def generate_content(self, request: GenerateContentRequest, context: grpc.aio.ServicerContext) -> GenerateContentResponse:
+        self.calls += 1
+        await self.behaviour.delay()
+        if self.behaviour.fails():
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "The model is overloaded. Please try again later.")
+        return GenerateContentResponse(candidates=[Candidate(
+            content=Content(parts=[Part(text=self.reply_text(request))], role="model"),
+            finish_reason=Candidate.FinishReason.STOP,
+        )])
+
+
+def create_grpc_server(gemini: GeminiStandIn, port: int) -> grpc.aio.Server:
+    server = grpc.aio.server()
+    handler = grpc.method_handlers_generic_handler(GEMINI_SERVICE, {
+        "GenerateContent": grpc.unary_unary_rpc_method_handler(
+            gemini.generate_content,
+            request_deserializer=GenerateContentRequest.deserialize,
+            response_serializer=GenerateContentResponse.serialize,
+        ),
+    })
+    server.add_generic_rpc_handlers((handler,))
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    return server
+
+
+async def serve(port: int, grpc_port: int, profile: Dict, seed_scores: int, seed: int):
+    rng = random.Random(seed)
+    grpc_server = create_grpc_server(GeminiStandIn(profile["gemini"], rng), grpc_port)
+    await grpc_server.start()
+    config = uvicorn.Config(create_http_app(profile, rng, seed_scores), host="127.0.0.1", port=port, log_level="warning")
+    try:
+        await uvicorn.Server(config).serve()
+    finally:
+        await grpc_server.stop(grace=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Supabase and Gemini stand-ins for load tests")
+    parser.add_argument("--port", type=int, default=54321, help="HTTP port (Storage and PostgREST)")
+    parser.add_argument("--grpc-port", type=int, default=54322, help="gRPC port (Gemini)")
+    parser.add_argument("--profile", default="realistic", choices=sorted(PROFILES))
+    parser.add_argument("--set", action="append", default=[], metavar="SERVICE.KEY=VALUE",
+                        help="Override a profile setting, e.g. gemini.error_rate=0.2")
+    parser.add_argument("--seed-scores", type=int, default=1000, help="Score rows present at startup")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    profile = build_profile(args.profile, args.set)
+    print(f"🧪 Stand-ins on http://127.0.0.1:{args.port} (Gemini gRPC :{args.grpc_port}), profile {args.profile}: {profile}")
+    asyncio.run(serve(args.port, args.grpc_port, profile, args.seed_scores, args.seed))
+
+
+if __name__ == "__main__":
+    main()
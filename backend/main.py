@@ -1,31 +1,163 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel, ValidationError
-from supabase import create_client, Client
+from supabase import create_client, acreate_client, Client, AsyncClient
+from supabase.lib.client_options import AsyncClientOptions, SyncClientOptions
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 import io
 import os
-import json
+import logging
+import re
 import base64
-import requests
+import math
+import hashlib
+import time
+import asyncio
+import httpx
 from dotenv import load_dotenv
 import google.generativeai as genai
 from google.generativeai.types import GenerationConfig
-import time
-import uuid
-from datetime import datetime
 
 load_dotenv()
 
+import deadline
+from analysis_cache import AnalysisCache, create_analysis_cache, hash_image, make_cache_key
+from gemini_limiter import UpstreamUnavailable, create_gemini_limiter
+from hedging import Hedger
+from http_pool import create_http_pool
+from image_utils import SNIFF_BYTES, get_normalize_config, normalize_screenshot, sniff_image_type
+from leaderboard import SEED_RETRY_SECONDS, WINDOWS, MaterializedLeaderboard, decode_cursor, encode_cursor
+from meme_queue import MemeRenderQueue
+from metrics import REGISTRY, stage_timer, stats_collector
+from response_cache import SWRCache, etag_matches
+from response_parser import RESPONSE_SCHEMA, MalformedResponse, ResponseParser, batch_response_schema
+from score_writer import ScoreWriter
+from single_flight import IdempotencyStore, SingleFlight
+from structured_logging import REQUEST_ID_HEADER, new_request_id, request_id_var, safe_headers, setup_logging, truncate
+from transcript import TEXT_SCORING_PREAMBLE, TRANSCRIPT_PROMPT, get_transcript_config, is_usable, ocr_transcript
+
+# Structured JSON logs, written off the event loop (see structured_logging)
+log_handler = setup_logging()
+logger = logging.getLogger("rizz")
+
 # Import meme generator (after load_dotenv to ensure paths are set)
 try:
-    from meme_generator import generate_meme_and_upload
+    from meme_generator import generate_meme_and_upload, get_catalog_meme, load_meme_catalog_index, warm_template_cache
 except ImportError:
-    print("⚠️ Warning: meme_generator not found, meme generation disabled")
+    logger.warning("⚠️ meme_generator not found, meme generation disabled")
     generate_meme_and_upload = None
+    get_catalog_meme = None
+    load_meme_catalog_index = None
+    warm_template_cache = None
+
+# Async clients used by the analysis path, created on startup (see lifespan)
+async_supabase: Optional[AsyncClient] = None
+http_client: Optional[httpx.AsyncClient] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the async Supabase/HTTP clients on startup and close them on shutdown"""
+    global async_supabase, http_client
+    # One pooled keep-alive client for Storage, PostgREST and image downloads
+    http_client = http_pool.open_async()
+    async_supabase = await acreate_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_ANON_KEY"),
+        options=AsyncClientOptions(httpx_client=http_client)
+    )
+    if warm_template_cache:
+        # Decode and resize meme templates once, off the request path
+        await asyncio.to_thread(warm_template_cache)
+    if load_meme_catalog_index:
+        # Know which (template, score) memes are already uploaded
+        try:
+            await asyncio.to_thread(load_meme_catalog_index, supabase)
+        except Exception as e:
+            logger.warning("⚠️ Could not load meme catalog index: %s", e)
+    meme_queue.start()
+    score_writer.start()
+    leaderboard.start()
+    yield
+    await leaderboard.stop()
+    await meme_queue.stop()
+    # Flush buffered scores before the clients they use are closed
+    await score_writer.stop()
+    await http_pool.aclose()
+
+
+app = FastAPI(title="Rizz Calculator API", version="1.0.0", lifespan=lifespan)
+
+# Upload limits (max 5MB per image)
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Reject uploads whose Content-Length already exceeds the limit, before
+    the multipart body is received and spooled
+    """
+    if request.method == "POST" and request.url.path == "/upload_screenshot/":
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": "Image size must be less than 5MB"})
+    return await call_next(request)
+
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "rizz_http_request_duration_seconds",
+    "HTTP request latency by route and status",
+    ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "rizz_http_requests_in_flight",
+    "HTTP requests currently being served"
+)
+
+
+# Middlewares run in reverse order of registration: request ids and metrics
+# are registered after the size check so they also cover its 413s
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status)
+        )
+        HTTP_IN_FLIGHT.dec()
+
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """Tag every log record of a request with one id, echoed back in X-Request-ID"""
+    request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
 
-app = FastAPI(title="Rizz Calculator API", version="1.0.0")
 
 # CORS middleware
 # Get frontend URL from environment variable, fallback to * for development
@@ -40,34 +172,134 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request bodies/headers are only logged when LOG_REQUEST_DUMPS is on, cut to LOG_DUMP_MAX_CHARS
+LOG_REQUEST_DUMPS = os.getenv("LOG_REQUEST_DUMPS", "false").lower() == "true"
+LOG_DUMP_MAX_CHARS = int(os.getenv("LOG_DUMP_MAX_CHARS", 2048))
+
 # Exception handler for request validation errors
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    body = await request.body()
-    body_str = body.decode('utf-8', errors='ignore') if body else ""
-    
-    print(f"\n{'='*60}")
-    print(f"❌ VALIDATION ERROR in {request.method} {request.url}")
-    print(f"{'='*60}")
-    print(f"📥 Request body: {body_str}")
-    print(f"📥 Request headers: {dict(request.headers)}")
-    print(f"📥 Validation errors: {exc.errors()}")
-    print(f"{'='*60}\n")
-    
-    return JSONResponse(
-        status_code=400,
-        content={"detail": f"Validation error: {exc.errors()}", "body": body_str}
-    )
+    # Each error's "input" can be the whole body; it is only logged with the opt-in dump
+    errors = [{key: value for key, value in error.items() if key != "input"} for error in exc.errors()]
+    logger.info("❌ Validation error in %s %s", request.method, request.url.path, extra={"errors": errors})
+    content = {"detail": f"Validation error: {exc.errors()}"}
+    # Opt-in, bounded dump of what was received. exc.body is what FastAPI
+    # already parsed, so the request body is never read a second time
+    if LOG_REQUEST_DUMPS:
+        body = truncate(str(exc.body), LOG_DUMP_MAX_CHARS) if exc.body is not None else ""
+        logger.info(
+            "📥 Rejected request",
+            extra={"body": body, "headers": safe_headers(request.headers, LOG_DUMP_MAX_CHARS)}
+        )
+        content["body"] = body
+    return JSONResponse(status_code=400, content=content)
+
+# Outbound HTTP connection pools shared by both Supabase clients and image downloads
+http_pool = create_http_pool()
 
 # Initialize Supabase client
 supabase: Client = create_client(
     os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_ANON_KEY")
+    os.getenv("SUPABASE_ANON_KEY"),
+    options=SyncClientOptions(httpx_client=http_pool.sync_client)
+)
+
+# Cache of parsed Gemini results keyed on image content + prompt/config
+analysis_cache = create_analysis_cache(supabase)
+# Chat transcripts by image hash; shares the persistent tier with a separate key space
+transcript_cache = AnalysisCache(
+    ttl_seconds=analysis_cache.ttl_seconds,
+    max_entries=analysis_cache.memory.max_entries,
+    persistent=analysis_cache.persistent
+)
+
+# Background render/upload of catalog memes, so it never adds to response latency
+meme_queue = MemeRenderQueue(
+    render=lambda score, template_id: render_meme(score, template_id),
+    workers=int(os.getenv("MEME_QUEUE_WORKERS", 2)),
+    max_depth=int(os.getenv("MEME_QUEUE_MAX_DEPTH", 100))
+)
+
+def render_meme(score: int, template_id: int):
+    with stage_timer("meme_render"):
+        return generate_meme_and_upload(score, supabase, template_id)
+
+
+async def insert_scores(rows: List[Dict]) -> List[Dict]:
+    """Insert a batch of score rows in a single request and return them as stored (with ids)"""
+    with stage_timer("db_insert"):
+        response = await async_supabase.table("scores").insert(rows).execute()
+    return response.data
+
+
+# PostgREST caps rows per request, so full scans are paged
+SCORES_PAGE_SIZE = 1000
+
+
+async def load_all_scores() -> List[Dict]:
+    """
+    Page through every score row (id, nickname, rizz_score, created_at)
+
+    Pages are keyset-based (id > last id seen): ids are random UUIDs, so an
+    OFFSET page boundary would shift under concurrent inserts and each page
+    would rescan everything before it. Rows inserted behind the cursor are
+    missed here and covered by the leaderboard's replay of recorded rows.
+    """
+    rows = []
+    last_id = None
+    while True:
+        query = async_supabase.table("scores").select("id, nickname, rizz_score, created_at")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = await query.order("id").limit(SCORES_PAGE_SIZE).execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < SCORES_PAGE_SIZE:
+            return rows
+        last_id = page[-1]["id"]
+
+
+# Leaderboard aggregate: seeded once, updated from the score write path,
+# reconciled with the database every LEADERBOARD_RECONCILE_SECONDS
+leaderboard = MaterializedLeaderboard(
+    load_all_scores,
+    reconcile_interval=float(os.getenv("LEADERBOARD_RECONCILE_SECONDS", 300))
+)
+
+# Leaderboard responses tolerate a few seconds of staleness
+leaderboard_cache = SWRCache(
+    ttl=float(os.getenv("LEADERBOARD_CACHE_TTL", 5)),
+    stale_ttl=float(os.getenv("LEADERBOARD_CACHE_SWR", 30)),
+    max_entries=int(os.getenv("LEADERBOARD_CACHE_SIZE", 256))
 )
 
+# Write-behind buffer for score rows, flushed by a single writer task
+score_writer = ScoreWriter(
+    insert_scores,
+    batch_size=int(os.getenv("SCORE_BATCH_SIZE", 50)),
+    flush_interval=float(os.getenv("SCORE_FLUSH_INTERVAL", 1.0)),
+    on_flush=leaderboard.record
+)
+
+# Coalescing of concurrent duplicate work, and replay of completed requests
+# retried with the same Idempotency-Key
+analysis_flights = SingleFlight()
+request_flights = SingleFlight()
+idempotency_store = IdempotencyStore(ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", 600)))
+
 # Configure Gemini
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 model = genai.GenerativeModel('gemini-2.5-flash')
+gemini_limiter = create_gemini_limiter()
+gemini_hedger = Hedger(
+    enabled=os.getenv("GEMINI_HEDGE", "0") == "1",
+    percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", 0.95)),
+    budget_ratio=float(os.getenv("GEMINI_HEDGE_BUDGET", 0.05)),
+    overloaded=lambda: gemini_limiter.limiter.engaged
+)
+
+# Overall latency budget for /calculate_rizz/ (download, preprocessing, Gemini)
+REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", 30))
 
 # Pydantic models for request bodies
 class CalculateRizzRequest(BaseModel):
@@ -75,65 +307,112 @@ class CalculateRizzRequest(BaseModel):
     nickname: str
 
 
+class CalculateRizzBatchRequest(BaseModel):
+    image_urls: List[str]
+    nickname: str
+
+
 @app.get("/")
 def root():
     return {"message": "Rizz Calculator API", "status": "running"}
 
 
+MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.heic': 'image/heic',
+    '.heif': 'image/heif'
+}
+MIME_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/heic': '.heic',
+    'image/heif': '.heif'
+}
+
+# Storage paths known to exist, so repeat uploads skip even the existence check
+MAX_KNOWN_UPLOADS = 10000
+known_uploads: "OrderedDict[str, None]" = OrderedDict()
+
+# Matches content-addressed upload URLs: .../object/public/chat-images/guest/<sha256>.<ext>
+CONTENT_ADDRESSED_URL = re.compile(r"/object/public/chat-images/guest/([0-9a-f]{64})\.[A-Za-z0-9]+$")
+
+
+def remember_upload(file_path: str):
+    """Record a storage path as present, evicting the oldest entries past the cap"""
+    known_uploads[file_path] = None
+    known_uploads.move_to_end(file_path)
+    while len(known_uploads) > MAX_KNOWN_UPLOADS:
+        known_uploads.popitem(last=False)
+
+
+def content_hash_from_url(image_url: str) -> Optional[str]:
+    """Return the SHA-256 embedded in a content-addressed upload URL, if any"""
+    match = CONTENT_ADDRESSED_URL.search(image_url.split('?', 1)[0])
+    return match.group(1) if match else None
+
+
 @app.post("/upload_screenshot/")
 async def upload_screenshot(file: UploadFile = File(...)):
     """
     Upload a chat screenshot image (Button 1)
     Returns the image URL for use in calculate_rizz endpoint
     """
-    # Validate file type
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    # Read in chunks so memory stays bounded by the size limit, hashing as we go
+    hasher = hashlib.sha256()
+    buffer = bytearray()
+    content_type = None
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if content_type is None:
+            # Validate file type from magic bytes rather than the client-supplied header
+            content_type = sniff_image_type(chunk[:SNIFF_BYTES])
+            if content_type is None:
+                raise HTTPException(status_code=400, detail="File must be an image")
+        # Validate file size (max 5MB) before buffering any further
+        if len(buffer) + len(chunk) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Image size must be less than 5MB")
+        hasher.update(chunk)
+        buffer.extend(chunk)
     
-    # Validate file size (max 5MB)
-    contents = await file.read()
-    if len(contents) > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Image size must be less than 5MB")
+    if content_type is None:
+        raise HTTPException(status_code=400, detail="File must be an image")
+    contents = bytes(buffer)
     
     try:
-        # Generate unique filename to avoid duplicates
-        file_ext = os.path.splitext(file.filename)[1] if file.filename else '.jpg'
-        unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{file_ext}"
-        file_path = f"guest/{unique_filename}"
+        # Content-addressed path: identical bytes always map to the same object
+        content_hash = hasher.hexdigest()
+        file_ext = MIME_EXTENSIONS[content_type]
+        file_path = f"guest/{content_hash}{file_ext}"
+        bucket = async_supabase.storage.from_("chat-images")
         
-        # Upload to Supabase Storage
-        try:
-            upload_response = supabase.storage.from_("chat-images").upload(
-                file_path,
-                contents,
-                file_options={"content-type": file.content_type, "upsert": "true"}
-            )
-        except Exception as upload_error:
-            error_str = str(upload_error)
-            # If duplicate error, try to delete and re-upload
-            if '409' in error_str or 'Duplicate' in error_str or 'already exists' in error_str.lower():
-                try:
-                    supabase.storage.from_("chat-images").remove([file_path])
-                    upload_response = supabase.storage.from_("chat-images").upload(
-                        file_path,
-                        contents,
-                        file_options={"content-type": file.content_type}
-                    )
-                except Exception as retry_error:
-                    # If delete/retry fails, use a new unique filename
-                    unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{file_ext}"
-                    file_path = f"guest/{unique_filename}"
-                    upload_response = supabase.storage.from_("chat-images").upload(
-                        file_path,
-                        contents,
-                        file_options={"content-type": file.content_type}
-                    )
-            else:
-                raise
+        if file_path in known_uploads or await bucket.exists(file_path):
+            logger.info("♻️ Duplicate upload, reusing existing object: %s", file_path)
+        else:
+            # Upload to Supabase Storage
+            try:
+                await bucket.upload(
+                    file_path,
+                    contents,
+                    file_options={"content-type": content_type}
+                )
+            except Exception as upload_error:
+                error_str = str(upload_error)
+                # An identical concurrent upload won the race - same bytes, nothing to redo
+                if not ('409' in error_str or 'Duplicate' in error_str or 'already exists' in error_str.lower()):
+                    raise
+        remember_upload(file_path)
         
         # Get public URL
-        image_url = supabase.storage.from_("chat-images").get_public_url(file_path)
-        print(f"✅ Upload successful, file_path: {file_path}, image_url: {image_url}")
+        image_url = await bucket.get_public_url(file_path)
+        logger.info("✅ Upload successful: %s", file_path)
         
         return {
             "success": True,
@@ -147,147 +426,31 @@ async def upload_screenshot(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error uploading image: {str(e)}")
 
 
-@app.post("/calculate_rizz/")
-async def calculate_rizz(request: CalculateRizzRequest):
-    """
-    Calculate rizz score from uploaded screenshot image URL (Button 2)
-    Requires image_url from upload_screenshot endpoint and nickname
-    """
-    print(f"\n{'='*60}")
-    print(f"🔍 CALCULATE_RIZZ ENDPOINT CALLED")
-    print(f"{'='*60}")
-    print(f"📥 Request received: {request}")
-    print(f"📥 Request type: {type(request)}")
-    
-    try:
-        request_dict = request.model_dump() if hasattr(request, 'model_dump') else request.dict() if hasattr(request, 'dict') else str(request)
-        print(f"📥 Request dict: {request_dict}")
-    except Exception as e:
-        print(f"⚠️ Could not dump request: {e}")
-        request_dict = str(request)
-    
-    image_url = request.image_url
-    nickname = request.nickname.strip() if request.nickname else ""
-    
-    print(f"📝 Image URL: {image_url}")
-    print(f"📝 Nickname: {nickname}")
-    
-    if not image_url:
-        print(f"❌ ERROR: image_url is missing or empty")
-        raise HTTPException(status_code=400, detail="image_url is required")
-    
-    if not nickname:
-        print(f"❌ ERROR: nickname is missing or empty")
-        raise HTTPException(status_code=400, detail="nickname is required")
-    
-    if len(nickname) > 30:
-        print(f"❌ ERROR: nickname too long")
-        raise HTTPException(status_code=400, detail="nickname must be 30 characters or less")
-    
-    if not isinstance(image_url, str):
-        print(f"❌ ERROR: image_url is not a string. Type: {type(image_url)}")
-        raise HTTPException(status_code=400, detail=f"image_url must be a string, got {type(image_url)}")
-    
-    print(f"✅ Image URL validated: {image_url[:50]}...")
-    print(f"✅ Nickname validated: {nickname}")
-    
-    try:
-        print(f"\n📥 Step 1: Downloading image from Supabase Storage...")
-        print(f"   Image URL: {image_url}")
-        
-        # Extract file path from URL
-        # URL format: https://<project>.supabase.co/storage/v1/object/public/<bucket>/<path>
-        # Or: https://<project>.supabase.co/storage/v1/object/sign/<bucket>/<path>?token=...
-        try:
-            # Try to extract path from public URL
-            if '/object/public/' in image_url:
-                # Public URL format
-                path_start = image_url.find('/object/public/') + len('/object/public/')
-                bucket_and_path = image_url[path_start:]
-                bucket_end = bucket_and_path.find('/')
-                bucket_name = bucket_and_path[:bucket_end]
-                file_path = bucket_and_path[bucket_end + 1:]
-                print(f"   Extracted bucket: {bucket_name}")
-                print(f"   Extracted path: {file_path}")
-                
-                # Download directly from Supabase Storage
-                file_data = supabase.storage.from_(bucket_name).download(file_path)
-                contents = file_data
-                
-                # Detect MIME type from file extension
-                file_ext = os.path.splitext(file_path)[1].lower()
-                mime_types = {
-                    '.jpg': 'image/jpeg',
-                    '.jpeg': 'image/jpeg',
-                    '.png': 'image/png',
-                    '.gif': 'image/gif',
-                    '.webp': 'image/webp'
-                }
-                mime_type = mime_types.get(file_ext, 'image/jpeg')
-                
-            elif '/object/sign/' in image_url:
-                # Signed URL - use HTTP GET
-                print(f"   Using signed URL, downloading via HTTP...")
-                image_response = requests.get(image_url, timeout=30)
-                if image_response.status_code != 200:
-                    print(f"❌ ERROR: Failed to download signed URL. Status: {image_response.status_code}")
-                    raise HTTPException(status_code=400, detail=f"Failed to download image: Status {image_response.status_code}")
-                contents = image_response.content
-                mime_type = image_response.headers.get('content-type', 'image/jpeg')
-            else:
-                # Fallback: try HTTP GET
-                print(f"   Unknown URL format, trying HTTP GET...")
-                image_response = requests.get(image_url, timeout=30)
-                if image_response.status_code != 200:
-                    print(f"❌ ERROR: Failed to download image. Status: {image_response.status_code}")
-                    print(f"   Response text: {image_response.text[:200]}")
-                    raise HTTPException(status_code=400, detail=f"Failed to download image from URL: {image_url}. Status: {image_response.status_code}")
-                contents = image_response.content
-                mime_type = image_response.headers.get('content-type', 'image/jpeg')
-            
-            print(f"✅ Image downloaded successfully")
-            print(f"   Size: {len(contents)} bytes ({len(contents) / 1024:.2f} KB)")
-            print(f"   MIME type: {mime_type}")
-            
-        except Exception as e:
-            print(f"❌ ERROR: Exception downloading image: {str(e)}")
-            print(f"   Error type: {type(e)}")
-            import traceback
-            print(f"   Traceback: {traceback.format_exc()}")
-            raise HTTPException(status_code=400, detail=f"Failed to download image: {str(e)}")
-        
-        # Validate file size (max 5MB)
-        if len(contents) > 5 * 1024 * 1024:
-            print(f"❌ ERROR: Image too large: {len(contents)} bytes")
-            raise HTTPException(status_code=400, detail="Image size must be less than 5MB")
+# Use Gemini Vision API to analyze the image for rizz
+# prompt = """
+# Analyze this chat screenshot image for "rizz" (charisma/flirt game, charm, smoothness).
         
-        print(f"✅ File size validated")
+# Rate the rizz on a scale of 0-100 where:
+# - 0-30: Needs major work (cringe, awkward, too forward)
+# - 31-50: Average (decent but could improve)
+# - 51-70: Good rizz (smooth, engaging, playful)
+# - 71-85: Great rizz (confident, witty, charming)
+# - 86-100: God-tier rizz (legendary, smooth operator)
         
-        # Use Gemini Vision API to analyze the image for rizz
-        # prompt = """
-        # Analyze this chat screenshot image for "rizz" (charisma/flirt game, charm, smoothness).
+# Respond ONLY with valid JSON in this exact format:
+# {
+#     "score": <integer 0-100>,
+#     "suggestions": [
+#         "<first improvement suggestion>",
+#         "<second improvement suggestion>",
+#         "<third improvement suggestion>"
+#     ],
+#     "reasoning": "<brief explanation of the score>"
+# }
         
-        # Rate the rizz on a scale of 0-100 where:
-        # - 0-30: Needs major work (cringe, awkward, too forward)
-        # - 31-50: Average (decent but could improve)
-        # - 51-70: Good rizz (smooth, engaging, playful)
-        # - 71-85: Great rizz (confident, witty, charming)
-        # - 86-100: God-tier rizz (legendary, smooth operator)
-        
-        # Respond ONLY with valid JSON in this exact format:
-        # {
-        #     "score": <integer 0-100>,
-        #     "suggestions": [
-        #         "<first improvement suggestion>",
-        #         "<second improvement suggestion>",
-        #         "<third improvement suggestion>"
-        #     ],
-        #     "reasoning": "<brief explanation of the score>"
-        # }
-        
-        # Be honest, constructive, and fun in your feedback. Focus on humor, confidence, playfulness, and engagement.
-        # """
-        prompt = """
+# Be honest, constructive, and fun in your feedback. Focus on humor, confidence, playfulness, and engagement.
+# """
+RIZZ_PROMPT = """
         ### ROLE & OBJECTIVE
 You are a brutally honest, elite dating coach and social dynamics expert. Your job is to evaluate the "Rizz" (flirting skill, wit, and charm) of a user's chat conversation. 
 
@@ -321,7 +484,7 @@ Respond ONLY with valid JSON. No markdown, no backticks.
 CRITICAL: suggestions MUST be an array of exactly 3 strings. Each suggestion should be a specific, actionable tip.
 
         """
-        # prompt="""
+# prompt="""
 #         prompt = """
 #         You are an expert social dynamics coach and "Rizz" consultant specializing in Gen Z dating culture and digital communication. Your task is to analyze the provided chat screenshot or text for "rizz" (charisma, wit, confidence, and game).
 
@@ -351,267 +514,797 @@ CRITICAL: suggestions MUST be an array of exactly 3 strings. Each suggestion sho
 # You must respond with valid JSON only. Do not include markdown formatting (likejson). The structure must be: { "score": <integer_0_to_100>, "rizz_level": "<string_from_scale_above>", "best_line": "<string_quote_from_user_or_null>", "constructive_feedback": [ "<specific_actionable_tip_1>", "<specific_actionable_tip_2>" ], "reasoning": "<short_punchy_explanation_of_the_score_max_2_sentences>" }
 
 #         """
-        
-        print(f"\n📥 Step 2: Encoding image to base64...")
-        # Encode image to base64
-        base64_image = base64.b64encode(contents).decode('utf-8')
-        print(f"✅ Base64 encoded: {len(base64_image)} characters")
-        
-        print(f"\n📥 Step 3: Calling Gemini Vision API...")
-        # Generate content with Gemini Vision API
-        # Add retry logic for rate limiting/overload errors
-        max_retries = 3
-        retry_delay = 2  # seconds
-        
-        response = None
-        last_error = None
-        
-        for attempt in range(max_retries):
-            try:
-                print(f"   Attempt {attempt + 1}/{max_retries}")
-                print(f"   MIME type: {mime_type}")
-                print(f"   Base64 length: {len(base64_image)}")
-                
-                response = model.generate_content(
-                    [prompt, {
-                        "mime_type": mime_type,
-                        "data": base64_image
-                    }],
-                    generation_config=GenerationConfig(
-                        response_mime_type="application/json",
-                        temperature=0.7,
-                        max_output_tokens=2048
-                    )
-                )
-                
-                print(f"   Gemini response received")
-                print(f"   Response type: {type(response)}")
-                
-                # Simplified text extraction
-                if response and response.text:
-                    response_text = response.text.strip()
-                    print(f"✅ Got response text: {response_text[:100]}...")
-                else:
-                    print(f"❌ ERROR: Empty response from Gemini API")
-                    print(f"   Response: {response}")
-                    raise ValueError("Empty response from Gemini API")
-                
-                break  # Success
-                
-            except Exception as e:
-                last_error = e
-                error_str = str(e)
-                print(f"❌ ERROR in attempt {attempt + 1}: {error_str}")
-                print(f"   Error type: {type(e)}")
-                
-                # Check if it's a rate limit/overload error
-                if '503' in error_str or 'overloaded' in error_str.lower() or 'UNAVAILABLE' in error_str:
-                    if attempt < max_retries - 1:
-                        wait_time = retry_delay * (attempt + 1)  # Exponential backoff
-                        print(f"⚠️ Gemini API overloaded, retrying in {wait_time} seconds...")
-                        time.sleep(wait_time)
-                        continue
-                print(f"❌ Fatal error, not retrying")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Error calling Gemini API: {error_str}"
-                )
-        
-        if response is None:
-            print(f"❌ ERROR: No response after {max_retries} attempts")
+
+# Bump-free prompt versioning: any edit to the prompt changes the cache key
+PROMPT_VERSION = hashlib.sha256(RIZZ_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": RESPONSE_SCHEMA,
+    "temperature": 0.7,
+    "max_output_tokens": 2048
+}
+
+# Several screenshots of one chat are scored together in a single Gemini call
+BATCH_RIZZ_PROMPT = RIZZ_PROMPT + """
+### MULTIPLE SCREENSHOTS
+The images are consecutive screenshots of ONE conversation, in order. "score", "suggestions" and "reasoning" must judge the conversation as a whole.
+Also include "per_image": an array with exactly one entry per screenshot, in the same order, each {"score": <integer 0-100>, "reasoning": "<1 sentence about that part of the chat>"}.
+"""
+BATCH_PROMPT_VERSION = hashlib.sha256(BATCH_RIZZ_PROMPT.encode("utf-8")).hexdigest()[:12]
+MAX_BATCH_IMAGES = int(os.getenv("MAX_BATCH_IMAGES", 10))
+# Gemini refuses inline requests over 20MB and images travel base64-encoded
+# (4/3 larger), so the prepared screenshots of one batch are capped below that
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", 14 * 1024 * 1024))
+
+
+def batch_generation_config(image_count: int) -> Dict:
+    return {**GENERATION_CONFIG, "response_schema": batch_response_schema(image_count)}
+
+
+# Extra Gemini calls allowed when a reply can't be parsed at all
+GEMINI_PARSE_RETRIES = int(os.getenv("GEMINI_PARSE_RETRIES", 1))
+response_parser = ResponseParser()
+
+# Screenshot preprocessing applied before Gemini (see image_utils.get_normalize_config)
+NORMALIZE_CONFIG = get_normalize_config()
+
+# Optional text fast path: transcribe once, score the transcript (see transcript.get_transcript_config)
+TRANSCRIPT_CONFIG = get_transcript_config()
+transcript_model = genai.GenerativeModel(TRANSCRIPT_CONFIG["model"]) if TRANSCRIPT_CONFIG["mode"] == "gemini" else None
+
+
+async def analyze_with_gemini(contents: bytes, mime_type: str) -> Tuple[Dict, bool]:
+    """
+    Run the rizz prompt against an image with Gemini and parse the result
+    
+    Args:
+        contents: Raw image bytes
+        mime_type: MIME type of the image
+    
+    Returns:
+        Tuple of (result dict, whether it came from the model rather than the fallback)
+    """
+    return await run_gemini_analysis(
+        [(contents, mime_type)],
+        RIZZ_PROMPT,
+        GENERATION_CONFIG,
+        response_parser.parse,
+        response_parser.fallback
+    )
+
+
+async def analyze_batch_with_gemini(images: List[Tuple[bytes, str]]) -> Tuple[Dict, bool]:
+    """
+    Score several screenshots of one conversation with a single Gemini call
+    
+    Args:
+        images: (image bytes, MIME type) per screenshot, in conversation order
+    
+    Returns:
+        Tuple of (result dict with per_image, whether it came from the model rather than the fallback)
+    """
+    image_count = len(images)
+    return await run_gemini_analysis(
+        images,
+        BATCH_RIZZ_PROMPT,
+        batch_generation_config(image_count),
+        lambda text: response_parser.parse_batch(text, image_count),
+        lambda: response_parser.fallback(image_count)
+    )
+
+
+async def analyze_transcript_with_gemini(transcript: str) -> Tuple[Dict, bool]:
+    """
+    Run the rizz prompt against a chat transcript instead of an image
+    
+    Returns:
+        Tuple of (result dict, whether it came from the model rather than the fallback)
+    """
+    return await run_gemini_analysis(
+        [],
+        RIZZ_PROMPT + TEXT_SCORING_PREAMBLE + transcript,
+        GENERATION_CONFIG,
+        response_parser.parse,
+        response_parser.fallback
+    )
+
+
+async def run_gemini_analysis(
+    images: List[Tuple[bytes, str]],
+    prompt: str,
+    generation_config: Dict,
+    parse: Callable[[str], Dict],
+    fallback: Callable[[], Dict]
+) -> Tuple[Dict, bool]:
+    """
+    Send a prompt plus images to Gemini and parse the reply (Steps 2-4)
+    
+    Args:
+        images: (image bytes, MIME type) pairs, sent in order after the prompt
+        prompt: Instruction text
+        generation_config: Gemini generation parameters
+        parse: Turns reply text into a result, raising MalformedResponse
+        fallback: Builds the default result when every reply was malformed
+    
+    Returns:
+        Tuple of (result dict, whether it came from the model rather than the fallback)
+    """
+    logger.debug("📥 Step 2: Encoding %d image(s) to base64 (%d prompt chars)", len(images), len(prompt))
+    # Encode images to base64; with several screenshots each one is labelled
+    # so the model can refer to them in order
+    parts = [prompt]
+    with stage_timer("encode"):
+        for index, (contents, mime_type) in enumerate(images):
+            if len(images) > 1:
+                parts.append(f"Screenshot {index + 1}:")
+            parts.append({
+                "mime_type": mime_type,
+                "data": base64.b64encode(contents).decode('utf-8')
+            })
+    
+    logger.debug("📥 Step 3: Calling Gemini Vision API (%s)", ", ".join(mime_type for _, mime_type in images))
+    
+    async def request_analysis():
+        # Slow calls may be hedged with a second identical request; the
+        # request deadline cancels whatever is still running
+        response = await deadline.within(
+            gemini_hedger.run(lambda: model.generate_content_async(
+                parts,
+                generation_config=GenerationConfig(**generation_config)
+            )),
+            "Gemini call"
+        )
+        if not (response and response.text):
+            logger.warning("❌ Empty response from Gemini API")
+            raise ValueError("Empty response from Gemini API")
+        return response
+    
+    # Malformed replies are retried before falling back to the default score
+    parse_attempts = 1 + GEMINI_PARSE_RETRIES
+    for attempt in range(parse_attempts):
+        # Concurrency limit, overload retries and circuit breaker are shared by all requests
+        try:
+            with stage_timer("gemini"):
+                response = await gemini_limiter.call(request_analysis)
+        except UpstreamUnavailable as e:
+            logger.warning("❌ Gemini unavailable: %s", e)
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error("❌ Fatal error calling Gemini: %s: %s", type(e).__name__, e)
             raise HTTPException(
                 status_code=500,
-                detail=f"Failed to get response from Gemini API after {max_retries} attempts: {str(last_error)}"
+                detail=f"Error calling Gemini API: {str(e)}"
             )
         
-        print(f"\n📥 Step 4: Parsing JSON response...")
-        # Parse JSON response
+        logger.debug("📥 Step 4: Parsing Gemini response (%d chars)", len(response.text))
         try:
-            result_str = response.text.strip()
-            
-            # Check if result_str is empty
-            if not result_str:
-                raise ValueError("Empty response text from Gemini API")
-            
-            # Remove markdown code blocks if present
-            if result_str.startswith("```json"):
-                result_str = result_str[7:]
-            if result_str.startswith("```"):
-                result_str = result_str[3:]
-            if result_str.endswith("```"):
-                result_str = result_str[:-3]
-            result_str = result_str.strip()
-            
-            # Validate we still have content after cleaning
-            if not result_str:
-                raise ValueError("Empty JSON after cleaning markdown")
-            
-            result = json.loads(result_str)
-            
-            # Validate response structure
-            if not isinstance(result.get("score"), int) or not (0 <= result["score"] <= 100):
-                raise ValueError("Invalid score in response")
-            
-            # Handle suggestions - convert string to array if needed
-            suggestions = result.get("suggestions", [])
-            if isinstance(suggestions, str):
-                # If Gemini returned a single string, split it into 3 suggestions
-                print(f"⚠️ WARNING: Suggestions is a string, converting to array")
-                # Try to split by periods or newlines, or create 3 suggestions from the string
-                suggestions_list = [s.strip() for s in suggestions.split('.') if s.strip()][:3]
-                # If we don't have 3, pad with generic suggestions
-                while len(suggestions_list) < 3:
-                    suggestions_list.append("Keep practicing and refining your approach.")
-                result["suggestions"] = suggestions_list[:3]
-            elif not isinstance(suggestions, list):
-                raise ValueError("Suggestions must be an array")
-            elif len(suggestions) != 3:
-                # If we have fewer than 3, pad with generic ones
-                print(f"⚠️ WARNING: Got {len(suggestions)} suggestions, expected 3")
-                while len(suggestions) < 3:
-                    suggestions.append("Keep practicing and refining your approach.")
-                result["suggestions"] = suggestions[:3]
-                
-        except (json.JSONDecodeError, ValueError, KeyError, AttributeError) as e:
-            # Fallback response if JSON parsing fails
-            print(f"❌ ERROR parsing JSON: {e}")
-            print(f"   Error type: {type(e)}")
-            print(f"   Response text: {response.text if hasattr(response, 'text') else 'No text attribute'}")
-            print(f"   Response: {response}")
-            result = {
-                "score": 50,
-                "suggestions": [
-                    "Try asking more engaging questions to show interest.",
-                    "Add emojis or playful language to improve the vibe.",
-                    "End with a callback hook or question to keep the conversation going."
-                ],
-                "reasoning": "Unable to parse AI response, using default score."
-            }
-        
-        print(f"✅ JSON parsed successfully")
-        print(f"   Score: {result['score']}")
-        print(f"   Suggestions count: {len(result.get('suggestions', []))}")
+            with stage_timer("parse"):
+                result = parse(response.text)
+        except MalformedResponse as e:
+            logger.warning("❌ Malformed Gemini response: %s", e, extra={"response_text": truncate(response.text, 500)})
+            if attempt < parse_attempts - 1:
+                response_parser.counters["retries"] += 1
+                logger.info("⚠️ Retrying malformed response (%d/%d)", attempt + 1, GEMINI_PARSE_RETRIES)
+                continue
+            result = fallback()
+            logger.warning("⚠️ Using default score")
+            return result, False
         
-        print(f"\n📤 Step 5: Generating meme...")
-        # Generate meme with the rizz score
-        meme_url = None
-        if generate_meme_and_upload:
-            try:
-                meme_url = generate_meme_and_upload(result["score"], supabase)
-                print(f"✅ Meme generated: {meme_url}")
-            except Exception as e:
-                print(f"⚠️ Meme generation failed: {e}")
-                import traceback
-                print(f"   Traceback: {traceback.format_exc()}")
-                meme_url = None  # Continue without meme if generation fails
-        else:
-            print(f"⚠️ Meme generation disabled (module not found)")
-        
-        print(f"\n📤 Step 6: Storing score in database...")
-        # Store score in Supabase with nickname (non-blocking)
-        import threading
-        import queue
+        logger.info("✅ Gemini scored %d", result["score"])
+        return result, True
+
+
+async def download_image(image_url: str) -> Tuple[bytes, str]:
+    """
+    Download an image without blocking the event loop
+    
+    Args:
+        image_url: Public or signed Supabase Storage URL, or any HTTP URL
+    
+    Returns:
+        Tuple of (image bytes, MIME type)
+    """
+    # URL format: https://<project>.supabase.co/storage/v1/object/public/<bucket>/<path>
+    # Or: https://<project>.supabase.co/storage/v1/object/sign/<bucket>/<path>?token=...
+    if '/object/public/' in image_url:
+        # Public URL format
+        path_start = image_url.find('/object/public/') + len('/object/public/')
+        bucket_and_path = image_url[path_start:]
+        bucket_end = bucket_and_path.find('/')
+        bucket_name = bucket_and_path[:bucket_end]
+        file_path = bucket_and_path[bucket_end + 1:]
         
-        def store_score_async():
-            """Store score in database asynchronously"""
-            try:
-                score_data = {
-                    "nickname": nickname,
-                    "rizz_score": result["score"],
-                    "suggestions": result["suggestions"],
-                    "reasoning": result.get("reasoning", ""),
-                    "image_url": image_url,
-                    "meme_url": meme_url
-                }
-                
-                db_response = supabase.table("scores").insert(score_data).execute()
-                print(f"✅ Score stored in database")
-                print(f"   Score ID: {db_response.data[0]['id'] if db_response.data else 'N/A'}")
-            except Exception as e:
-                print(f"⚠️ Failed to store score in database: {e}")
-                import traceback
-                print(f"   Traceback: {traceback.format_exc()}")
+        # Download directly from Supabase Storage
+        contents = await async_supabase.storage.from_(bucket_name).download(file_path)
         
-        # Start database insert in background thread (fire and forget)
-        db_thread = threading.Thread(target=store_score_async, daemon=True)
-        db_thread.start()
+        # Detect MIME type from file extension
+        file_ext = os.path.splitext(file_path)[1].lower()
+        return contents, MIME_TYPES.get(file_ext, 'image/jpeg')
+    
+    # Signed URLs and any other URL format: plain HTTP GET
+    image_response = await http_client.get(image_url)
+    if image_response.status_code != 200:
+        logger.warning("❌ Failed to download image, status %d", image_response.status_code, extra={"response_text": truncate(image_response.text, 200)})
+        raise HTTPException(status_code=400, detail=f"Failed to download image from URL: {image_url}. Status: {image_response.status_code}")
+    return image_response.content, image_response.headers.get('content-type', 'image/jpeg')
+
+
+async def fetch_image(image_url: str) -> Tuple[bytes, str]:
+    """
+    Download and size-check the image to analyze (Step 1)
+    
+    Returns:
+        Tuple of (image bytes, MIME type)
+    """
+    logger.debug("📥 Step 1: Downloading image", extra={"image_url": image_url})
+    
+    try:
+        with stage_timer("download"):
+            contents, mime_type = await deadline.within(download_image(image_url), "image download")
+        logger.debug("✅ Image downloaded: %d bytes (%s)", len(contents), mime_type)
         
-        # Don't wait for database insert - return response immediately
-        print(f"📤 Database insert started in background...")
+    except (HTTPException, deadline.DeadlineExceeded):
+        raise
+    except Exception as e:
+        logger.warning("❌ Exception downloading image: %s", e, exc_info=True)
+        raise HTTPException(status_code=400, detail=f"Failed to download image: {str(e)}")
+    
+    # Validate file size (max 5MB)
+    if len(contents) > MAX_UPLOAD_BYTES:
+        logger.info("❌ Image too large: %d bytes", len(contents))
+        raise HTTPException(status_code=400, detail="Image size must be less than 5MB")
+    
+    return contents, mime_type
+
+
+def analysis_cache_key(image_digest: str) -> str:
+    """Cache key for an image under the current prompt, generation and preprocessing settings"""
+    inputs = {"preprocess": NORMALIZE_CONFIG}
+    if TRANSCRIPT_CONFIG["mode"] != "off":
+        # Scores from transcripts are a different function of the image
+        inputs["transcript"] = {**TRANSCRIPT_CONFIG, "preamble": TEXT_SCORING_PREAMBLE}
+    return make_cache_key(
+        image_digest,
+        PROMPT_VERSION,
+        {**GENERATION_CONFIG, **inputs}
+    )
+
+
+def transcript_cache_key(image_digest: str) -> str:
+    """Cache key for the transcript of an image under the current extraction settings"""
+    return make_cache_key(image_digest, "transcript", TRANSCRIPT_CONFIG)
+
+
+async def prepare_image(contents: bytes, mime_type: str) -> Tuple[bytes, str]:
+    """
+    Normalize the screenshot (downscale, strip metadata, re-encode) before
+    it is sent to Gemini. Falls back to the original bytes if Pillow can't
+    handle the format.
+    """
+    if not NORMALIZE_CONFIG["enabled"]:
+        return contents, mime_type
+    try:
+        with stage_timer("preprocess"):
+            normalized, normalized_mime = await asyncio.to_thread(
+                normalize_screenshot,
+                contents,
+                NORMALIZE_CONFIG["max_long_edge"],
+                NORMALIZE_CONFIG["format"],
+                NORMALIZE_CONFIG["quality"],
+                NORMALIZE_CONFIG["color"]
+            )
+    except Exception as e:
+        logger.warning("⚠️ Could not normalize image, sending original: %s", e)
+        return contents, mime_type
+    logger.debug("🗜️ Normalized image: %d -> %d bytes (%s)", len(contents), len(normalized), normalized_mime)
+    return normalized, normalized_mime
+
+
+async def get_analysis(image_url: str) -> Dict:
+    """
+    Resolve the analysis for an image URL, consulting the cache before
+    downloading the image or calling Gemini. Concurrent calls for the same
+    URL share one resolution
+    
+    Returns:
+        Dict with score, suggestions and reasoning
+    """
+    return await analysis_flights.do(("url", image_url), lambda: resolve_analysis(image_url))
+
+
+async def resolve_analysis(image_url: str) -> Dict:
+    # Content-addressed uploads carry their hash in the path, so a cached
+    # result can be served without downloading the image at all
+    image_digest = content_hash_from_url(image_url)
+    if image_digest:
+        result = await analysis_cache.get(analysis_cache_key(image_digest))
+        if result is not None:
+            logger.info("⚡ Analysis cache hit, skipping download and Gemini (score: %d)", result["score"])
+            return result
         
-        print(f"\n📤 Step 7: Returning response...")
-        print(f"{'='*60}\n")
+        # A cached transcript can be re-scored without downloading the image
+        if TRANSCRIPT_CONFIG["mode"] != "off":
+            transcript = await get_transcript(image_digest)
+            if is_usable(transcript, TRANSCRIPT_CONFIG["min_chars"]):
+                cache_key = analysis_cache_key(image_digest)
+                return await analysis_flights.do(
+                    ("content", cache_key),
+                    lambda: score_transcript_and_cache(transcript, cache_key)
+                )
+    
+    contents, mime_type = await fetch_image(image_url)
+    
+    content_digest = hash_image(contents)
+    cache_key = analysis_cache_key(content_digest)
+    if image_digest is None:
+        result = await analysis_cache.get(cache_key)
+        if result is not None:
+            logger.info("⚡ Analysis cache hit, skipping Gemini (score: %d)", result["score"])
+            return result
+    
+    # Different URLs with the same bytes still share one Gemini call
+    return await analysis_flights.do(
+        ("content", cache_key),
+        lambda: analyze_and_cache(contents, mime_type, content_digest, cache_key)
+    )
+
+
+async def analyze_and_cache(contents: bytes, mime_type: str, image_digest: str, cache_key: str) -> Dict:
+    # Normalized at most once, whether the Gemini transcript, the image fallback or both need it
+    prepared: List[Tuple[bytes, str]] = []
+    
+    async def prepared_image() -> Tuple[bytes, str]:
+        if not prepared:
+            prepared.append(await prepare_image(contents, mime_type))
+        return prepared[0]
+    
+    if TRANSCRIPT_CONFIG["mode"] != "off":
+        transcript = await get_transcript(image_digest, contents, mime_type, prepared_image)
+        if is_usable(transcript, TRANSCRIPT_CONFIG["min_chars"]):
+            return await score_transcript_and_cache(transcript, cache_key)
+        logger.info("⚠️ No usable transcript, scoring the image instead")
+    
+    result, parsed = await analyze_with_gemini(*await prepared_image())
+    # Only cache real model output, never the default-score fallback
+    if parsed:
+        await analysis_cache.set(cache_key, result)
+    return result
+
+
+async def score_transcript_and_cache(transcript: str, cache_key: str) -> Dict:
+    result, parsed = await analyze_transcript_with_gemini(transcript)
+    if parsed:
+        await analysis_cache.set(cache_key, result)
+    return result
+
+
+async def get_transcript(
+    image_digest: str,
+    contents: Optional[bytes] = None,
+    mime_type: Optional[str] = None,
+    prepared_image: Optional[Callable[[], Awaitable[Tuple[bytes, str]]]] = None
+) -> Optional[str]:
+    """
+    Transcript of a screenshot, extracted at most once per image
+    
+    Args:
+        image_digest: SHA-256 of the image bytes
+        contents: Image bytes; without them only the cache is consulted
+        mime_type: MIME type of the image
+        prepared_image: Returns the normalized image (see prepare_image), for
+            callers that may need it again afterwards; defaults to normalizing here
+    
+    Returns:
+        str: Transcript (possibly too short to use, see transcript.is_usable), or None
+    """
+    key = transcript_cache_key(image_digest)
+    cached = await transcript_cache.get(key)
+    if cached is not None:
+        logger.debug("⚡ Transcript cache hit (%d chars)", len(cached["text"]))
+        return cached["text"]
+    if contents is None:
+        return None
+    if prepared_image is None:
+        prepared_image = lambda: prepare_image(contents, mime_type)
+    return await analysis_flights.do(("transcript", key), lambda: extract_transcript(contents, prepared_image, key))
+
+
+async def extract_transcript(
+    contents: bytes,
+    prepared_image: Callable[[], Awaitable[Tuple[bytes, str]]],
+    key: str
+) -> Optional[str]:
+    logger.debug("📝 Extracting chat transcript (%s)", TRANSCRIPT_CONFIG["mode"])
+    try:
+        with stage_timer("transcription"):
+            if TRANSCRIPT_CONFIG["mode"] == "tesseract":
+                text = await deadline.within(asyncio.to_thread(ocr_transcript, contents), "transcription")
+            else:
+                # Tesseract reads the original pixels; Gemini gets the normalized image
+                contents, mime_type = await prepared_image()
+                
+                async def request_transcript():
+                    response = await deadline.within(
+                        transcript_model.generate_content_async(
+                            [TRANSCRIPT_PROMPT, {
+                                "mime_type": mime_type,
+                                "data": base64.b64encode(contents).decode('utf-8')
+                            }],
+                            generation_config=GenerationConfig(temperature=0, max_output_tokens=2048)
+                        ),
+                        "transcription"
+                    )
+                    return response.text
+                
+                text = await gemini_limiter.call(request_transcript)
+    except deadline.DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.warning("⚠️ Transcript extraction failed: %s", e)
+        return None
+    
+    text = (text or "").strip()
+    logger.debug("✅ Transcript: %d chars", len(text))
+    # Cached even when too short to use, so the extraction isn't repeated
+    await transcript_cache.set(key, {"text": text})
+    return text
+
+
+def batch_cache_key(image_digests: List[str]) -> str:
+    """Cache key for an ordered set of screenshots scored together"""
+    return make_cache_key(
+        ",".join(image_digests),
+        BATCH_PROMPT_VERSION,
+        {**batch_generation_config(len(image_digests)), "preprocess": NORMALIZE_CONFIG}
+    )
+
+
+async def get_batch_analysis(image_urls: List[str]) -> Dict:
+    """
+    Resolve one combined analysis for several screenshots of a conversation
+    
+    Returns:
+        Dict with score, suggestions, reasoning and per_image
+    """
+    # Download concurrently; one failed download fails the batch
+    images = await asyncio.gather(*(fetch_image(image_url) for image_url in image_urls))
+    
+    cache_key = batch_cache_key([hash_image(contents) for contents, _ in images])
+    result = await analysis_cache.get(cache_key)
+    if result is not None:
+        logger.info("⚡ Batch analysis cache hit, skipping Gemini (score: %d)", result["score"])
+        return result
+    
+    return await analysis_flights.do(("batch", cache_key), lambda: analyze_batch_and_cache(images, cache_key))
+
+
+async def analyze_batch_and_cache(images: List[Tuple[bytes, str]], cache_key: str) -> Dict:
+    prepared = await asyncio.gather(*(prepare_image(contents, mime_type) for contents, mime_type in images))
+    total_bytes = sum(len(contents) for contents, _ in prepared)
+    if total_bytes > MAX_BATCH_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Screenshots are too large to score together ({total_bytes / 1024 / 1024:.1f}MB, "
+                   f"max {MAX_BATCH_BYTES / 1024 / 1024:.1f}MB); send fewer or smaller screenshots"
+        )
+    result, parsed = await analyze_batch_with_gemini(list(prepared))
+    if parsed:
+        await analysis_cache.set(cache_key, result)
+    return result
+
+
+async def score_submission(image_url: str, nickname: str) -> Dict:
+    """
+    Steps after validation: analysis, meme, score row and response
+    Runs once per in-flight (image_url, nickname) pair
+    """
+    result = await get_analysis(image_url)
+    return complete_submission(result, image_url, nickname)
+
+
+async def batch_submission(image_urls: List[str], nickname: str) -> Dict:
+    """
+    Batch counterpart of score_submission: one analysis and one score row
+    for the whole conversation, plus per-screenshot results
+    """
+    if len(image_urls) == 1:
+        # A single screenshot shares the regular path and its cache entries
+        result = await get_analysis(image_urls[0])
+        per_image = [{"score": result["score"], "reasoning": result.get("reasoning", "")}]
+    else:
+        result = await get_batch_analysis(image_urls)
+        per_image = result["per_image"]
+    response = complete_submission(result, image_urls[0], nickname)
+    response["image_urls"] = image_urls
+    response["images"] = [
+        {"image_url": image_url, **entry} for image_url, entry in zip(image_urls, per_image)
+    ]
+    return response
+
+
+def complete_submission(result: Dict, image_url: str, nickname: str) -> Dict:
+    """Meme, score row and response for an analysis result (Steps 5-7)"""
+    logger.debug("📤 Step 5: Generating meme")
+    # The meme URL is deterministic, so return it now and render/upload in the background
+    meme_url = None
+    meme_ready = False
+    if generate_meme_and_upload:
+        try:
+            with stage_timer("meme"):
+                template_id, meme_score, meme_url, meme_ready = get_catalog_meme(result["score"], supabase)
+            if meme_ready:
+                logger.debug("✅ Meme from catalog: %s", meme_url)
+            elif meme_queue.submit(meme_score, template_id):
+                logger.debug("✅ Meme queued for rendering: %s", meme_url)
+            else:
+                logger.warning("⚠️ Meme queue saturated, skipping meme")
+                meme_url = None
+        except Exception as e:
+            logger.warning("⚠️ Meme generation failed: %s", e, exc_info=True)
+            meme_url = None  # Continue without meme if generation fails
+    else:
+        logger.debug("⚠️ Meme generation disabled (module not found)")
+    
+    logger.debug("📤 Step 6: Storing score in database")
+    # Store score in Supabase with nickname (buffered, written in batches)
+    score_data = {
+        "nickname": nickname,
+        "rizz_score": result["score"],
+        "suggestions": result["suggestions"],
+        "reasoning": result.get("reasoning", ""),
+        "image_url": image_url,
+        "meme_url": meme_url
+    }
+    if not score_writer.enqueue(score_data):
+        logger.warning("⚠️ Score buffer full, score not stored")
+    
+    return {
+        "score": result["score"],
+        "suggestions": result["suggestions"],
+        "reasoning": result.get("reasoning", ""),
+        "image_url": image_url,
+        "meme_url": meme_url,
+        "meme_ready": meme_ready,
+        "nickname": nickname
+    }
+
+
+@app.post("/calculate_rizz/")
+async def calculate_rizz(request: CalculateRizzRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Calculate rizz score from uploaded screenshot image URL (Button 2)
+    Requires image_url from upload_screenshot endpoint and nickname
+    
+    Concurrent duplicates (same image_url and nickname) share one analysis
+    and write one score row. An optional Idempotency-Key header makes
+    retries after completion replay the stored response too
+    """
+    image_url = request.image_url
+    nickname = request.nickname.strip() if request.nickname else ""
+    
+    logger.info("🔍 calculate_rizz called", extra={"image_url": image_url, "nickname": nickname})
+    
+    if not image_url:
+        raise HTTPException(status_code=400, detail="image_url is required")
+    
+    if not nickname:
+        raise HTTPException(status_code=400, detail="nickname is required")
+    
+    if len(nickname) > 30:
+        raise HTTPException(status_code=400, detail="nickname must be 30 characters or less")
+    
+    if not isinstance(image_url, str):
+        raise HTTPException(status_code=400, detail=f"image_url must be a string, got {type(image_url)}")
+    
+    return await run_submission(
+        (image_url, nickname),
+        idempotency_key,
+        lambda: score_submission(image_url, nickname)
+    )
+
+
+@app.post("/calculate_rizz_batch/")
+async def calculate_rizz_batch(request: CalculateRizzBatchRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Calculate one rizz score for a conversation spread over several screenshots
+    Requires image_urls (in conversation order) from upload_screenshot and nickname
+    
+    All screenshots are downloaded concurrently and scored by a single
+    Gemini call; the response has the combined score plus per-image results
+    """
+    image_urls = [url.strip() for url in request.image_urls if url and url.strip()]
+    nickname = request.nickname.strip() if request.nickname else ""
+    
+    logger.info("🔍 calculate_rizz_batch called", extra={"image_count": len(image_urls), "nickname": nickname})
+    
+    if not image_urls:
+        raise HTTPException(status_code=400, detail="image_urls is required")
+    
+    if len(image_urls) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IMAGES} screenshots per request")
+    
+    if not nickname:
+        raise HTTPException(status_code=400, detail="nickname is required")
+    
+    if len(nickname) > 30:
+        raise HTTPException(status_code=400, detail="nickname must be 30 characters or less")
+    
+    return await run_submission(
+        (tuple(image_urls), nickname),
+        idempotency_key,
+        lambda: batch_submission(image_urls, nickname)
+    )
+
+
+async def run_submission(
+    fingerprint: Tuple,
+    idempotency_key: Optional[str],
+    submit: Callable[[], Awaitable[Dict]]
+) -> Dict:
+    """
+    Run a validated submission under the request budget, coalescing
+    concurrent duplicates and honouring Idempotency-Key
+    
+    Args:
+        fingerprint: Identifies duplicate submissions (image URL(s) and nickname)
+        idempotency_key: Idempotency-Key header value, if any
+        submit: Coroutine function doing the work
+    """
+    if idempotency_key and len(idempotency_key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be 255 characters or less")
+    
+    # Every stage below draws on one latency budget
+    deadline.set_budget(REQUEST_BUDGET_SECONDS)
+    try:
+        if idempotency_key:
+            try:
+                stored = idempotency_store.get(idempotency_key, fingerprint)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            if stored is not None:
+                logger.info("♻️ Replaying stored response for Idempotency-Key %s", idempotency_key)
+                return stored
         
-        return {
-            "score": result["score"],
-            "suggestions": result["suggestions"],
-            "reasoning": result.get("reasoning", ""),
-            "image_url": image_url,
-            "meme_url": meme_url,
-            "nickname": nickname
-        }
+        response = await deadline.within(request_flights.do(fingerprint, submit), "analysis")
+        if idempotency_key:
+            idempotency_store.set(idempotency_key, fingerprint, response)
+        return response
         
     except HTTPException as e:
-        print(f"\n❌ HTTPException raised: {e.status_code} - {e.detail}")
-        print(f"{'='*60}\n")
+        logger.info("❌ HTTPException raised: %d - %s", e.status_code, e.detail)
         raise
+    except deadline.DeadlineExceeded as e:
+        logger.warning("⏱️ %s (budget %ss)", e, REQUEST_BUDGET_SECONDS)
+        raise HTTPException(status_code=504, detail=f"Analysis took too long, please try again ({e.stage})")
     except Exception as e:
-        print(f"\n❌ Unexpected exception: {type(e).__name__}: {str(e)}")
-        import traceback
-        print(f"   Traceback: {traceback.format_exc()}")
-        print(f"{'='*60}\n")
+        logger.error("❌ Unexpected exception: %s: %s", type(e).__name__, e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
+# Components whose stats() are served on /stats/ and exported on /metrics
+STATS_COMPONENTS = {
+    "analysis_cache": analysis_cache,
+    "meme_queue": meme_queue,
+    "score_writer": score_writer,
+    "leaderboard": leaderboard,
+    "leaderboard_cache": leaderboard_cache,
+    "analysis_flights": analysis_flights,
+    "request_flights": request_flights,
+    "idempotency": idempotency_store,
+    "gemini": gemini_limiter,
+    "gemini_hedging": gemini_hedger,
+    "response_parser": response_parser,
+    "transcript_cache": transcript_cache,
+    "logging": log_handler,
+    "http_pool": http_pool
+}
+REGISTRY.register_collector(stats_collector(STATS_COMPONENTS))
+
+
+@app.get("/stats/")
+def get_stats():
+    """
+    Runtime counters for caches and background work
+    """
+    return {name: component.stats() for name, component in STATS_COMPONENTS.items()}
+
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Stage latency histograms, HTTP metrics and component counters in Prometheus text format
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+LEADERBOARD_MAX_LIMIT = 100
+# Max seconds a request waits for the initial leaderboard seed before a 503
+LEADERBOARD_SEED_WAIT = float(os.getenv("LEADERBOARD_SEED_WAIT", 10))
+
+
+async def fetch_leaderboard(window: str, limit: int, cursor: Optional[str]) -> Dict:
+    """
+    One page of users ranked by average rizz score (grouped by nickname)
+
+    Args:
+        window: "all", "daily" (today, UTC) or "weekly" (this ISO week, UTC)
+        limit: Page size
+        cursor: next_cursor from the previous page, or None for the first page
+    """
+    after = decode_cursor(cursor, window) if cursor else None
+
+    # Served from the in-process per-window aggregates once they have been seeded
+    if not leaderboard.ready:
+        # The database function only knows the all-time top 10
+        if window == "all" and after is None and limit == 10:
+            try:
+                response = await async_supabase.rpc("get_leaderboard").execute()
+                if response.data:
+                    return {"leaderboard": response.data, "window": window, "next_cursor": None}
+            except Exception as rpc_error:
+                logger.warning("⚠️ RPC function not available, waiting for the leaderboard seed: %s", rpc_error)
+
+        # Everything else waits for the one background seed rather than scanning the table per request
+        if not await leaderboard.wait_ready(LEADERBOARD_SEED_WAIT):
+            raise HTTPException(
+                status_code=503,
+                detail="Leaderboard is still loading, please try again shortly",
+                headers={"Retry-After": str(math.ceil(SEED_RETRY_SECONDS))}
+            )
+
+    entries, next_key = leaderboard.page(window, limit, after)
+    return {
+        "leaderboard": entries,
+        "window": window,
+        "next_cursor": encode_cursor(window, next_key) if next_key else None
+    }
+
+
 @app.get("/leaderboard/")
-def get_leaderboard():
+async def get_leaderboard(
+    request: Request,
+    window: str = "all",
+    limit: int = 10,
+    cursor: Optional[str] = None
+):
     """
-    Get top 10 users by average rizz score (grouped by nickname)
+    Get users ranked by average rizz score (grouped by nickname)
+    Ties on average are broken by number of scores, then nickname.
+    Cached server-side and revalidatable via ETag/If-None-Match
+
+    Args:
+        window: "all" (default), "daily" or "weekly"
+        limit: Page size, 1-100 (default 10)
+        cursor: next_cursor from the previous page
     """
-    try:
-        # Use Supabase function if available, otherwise query directly
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of: {', '.join(WINDOWS)}")
+    if not 1 <= limit <= LEADERBOARD_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {LEADERBOARD_MAX_LIMIT}")
+    if cursor:
         try:
-            response = supabase.rpc("get_leaderboard").execute()
-            if response.data:
-                return {"leaderboard": response.data}
-        except Exception as rpc_error:
-            print(f"⚠️ RPC function not available, using direct query: {rpc_error}")
-        
-        # Fallback: Direct query
-        response = supabase.table("scores").select("nickname, rizz_score").execute()
-        
-        if not response.data:
-            return {"leaderboard": []}
-        
-        # Group by nickname and calculate average
-        nickname_scores = {}
-        for score in response.data:
-            nickname = score.get("nickname", "Anonymous")
-            if nickname not in nickname_scores:
-                nickname_scores[nickname] = []
-            nickname_scores[nickname].append(score.get("rizz_score", 0))
-        
-        # Calculate averages and sort
-        leaderboard = []
-        for nickname, scores in nickname_scores.items():
-            avg_score = sum(scores) / len(scores)
-            leaderboard.append({
-                "nickname": nickname,
-                "avg_rizz": round(avg_score),
-                "total_scores": len(scores)
-            })
-        
-        # Sort by average score (descending) and limit to top 10
-        leaderboard.sort(key=lambda x: x["avg_rizz"], reverse=True)
-        leaderboard = leaderboard[:10]
-        
-        return {"leaderboard": leaderboard}
-        
-    except Exception as e:
-        print(f"❌ Error fetching leaderboard: {e}")
-        import traceback
-        print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error fetching leaderboard: {str(e)}")
+            decode_cursor(cursor, window)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    entry = await leaderboard_cache.get(
+        (window, limit, cursor),
+        lambda: fetch_leaderboard(window, limit, cursor)
+    )
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={int(leaderboard_cache.ttl)}, stale-while-revalidate={int(leaderboard_cache.stale_ttl)}"
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 
 if __name__ == "__main__":
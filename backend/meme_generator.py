@@ -2,47 +2,140 @@
 Meme generator using Pillow to overlay text on meme templates
 """
 from PIL import Image, ImageDraw, ImageFont
+import logging
 import os
 import io
-from typing import Dict, Optional
-from meme_templates import get_random_template, get_template_by_id
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from meme_templates import MEME_TEMPLATES, get_available_templates, get_random_template, get_template_by_id
 
+logger = logging.getLogger(__name__)
 
-def get_font(font_size: int, bold: bool = False) -> Optional[ImageFont.FreeTypeFont]:
-    """Get a font, trying different options"""
-    try:
-        # Try to use a system font (Impact is classic for memes)
-        if os.name == 'nt':  # Windows
-            font_path = "C:/Windows/Fonts/impact.ttf"
-        elif os.name == 'posix':  # macOS/Linux
-            font_path = "/System/Library/Fonts/Supplemental/Impact.ttf"  # macOS
-            if not os.path.exists(font_path):
-                font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"  # Linux fallback
-        else:
-            font_path = None
-        
-        if font_path and os.path.exists(font_path):
-            return ImageFont.truetype(font_path, font_size)
-    except Exception as e:
-        print(f"⚠️ Could not load custom font: {e}")
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pre-rendered memes live at deterministic paths; bump the version when
+# rendering changes so stale images are not reused
+MEME_BUCKET = "chat-images"
+MEME_CATALOG_VERSION = "v1"
+
+# Public URLs of catalog memes known to exist, keyed by (template_id, score)
+_catalog_urls: Dict[Tuple[str, int], str] = {}
+
+# Ready-to-draw base images keyed by template id, decoded and resized once per process
+_template_images: Dict[str, Image.Image] = {}
+_template_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def resolve_font_path() -> Optional[str]:
+    """
+    Pick the meme font once per process: Impact -> DejaVu Sans Bold -> arial -> Pillow default
     
-    # Fallback to default font
+    Returns:
+        str: Font path/name for ImageFont.truetype, or None for the default bitmap font
+    """
+    # Try to use a system font (Impact is classic for memes)
+    if os.name == 'nt':  # Windows
+        candidates = ["C:/Windows/Fonts/impact.ttf"]
+    elif os.name == 'posix':  # macOS/Linux
+        candidates = [
+            "/System/Library/Fonts/Supplemental/Impact.ttf",  # macOS
+            "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"  # Linux fallback
+        ]
+    else:
+        candidates = []
+    
+    for font_path in candidates:
+        if os.path.exists(font_path):
+            logger.info("🔤 Meme font: %s", font_path)
+            return font_path
+    
+    # arial.ttf is looked up on FreeType's search path rather than a fixed location
     try:
-        return ImageFont.truetype("arial.ttf", font_size)
-    except:
+        ImageFont.truetype("arial.ttf", 10)
+        logger.info("🔤 Meme font: arial.ttf")
+        return "arial.ttf"
+    except OSError:
+        logger.warning("⚠️ No TrueType font found, using Pillow default font")
+        return None
+
+
+@lru_cache(maxsize=64)
+def _load_font(font_path: Optional[str], font_size: int) -> ImageFont.ImageFont:
+    """Parse a font at a given size, memoized on (path, size)"""
+    if font_path is None:
+        return ImageFont.load_default()
+    try:
+        return ImageFont.truetype(font_path, font_size)
+    except Exception as e:
+        logger.warning("⚠️ Could not load custom font: %s", e)
         return ImageFont.load_default()
 
 
-def generate_meme(score: int, template_id: Optional[str] = None) -> bytes:
+def get_font(font_size: int, bold: bool = False) -> Optional[ImageFont.FreeTypeFont]:
+    """Get the meme font at the given size (cached)"""
+    return _load_font(resolve_font_path(), font_size)
+
+
+def _render_template_base(template: Dict) -> Image.Image:
+    """Decode and resize a template image, or draw a placeholder if it is missing"""
+    base_image_path = template["image_path"]
+    full_image_path = os.path.join(BACKEND_DIR, base_image_path)
+    if not os.path.exists(full_image_path) and os.path.exists(base_image_path):
+        full_image_path = base_image_path
+    
+    if os.path.exists(full_image_path):
+        with Image.open(full_image_path) as source:
+            img = source.convert("RGB")
+        # Resize if needed
+        if img.size != tuple(template["image_size"]):
+            img = img.resize(template["image_size"], Image.Resampling.LANCZOS)
+        return img
+    
+    logger.warning("⚠️ Creating placeholder for missing template: %s", template['name'])
+    # Create a placeholder image
+    img = Image.new('RGB', template["image_size"], color=(200, 200, 200))
+    draw = ImageDraw.Draw(img)
+    # Draw a simple placeholder
+    draw.rectangle([10, 10, template["image_size"][0]-10, template["image_size"][1]-10], 
+                  outline=(100, 100, 100), width=3)
+    draw.text((template["image_size"][0]//2, template["image_size"][1]//2), 
+             f"Meme Template: {template['name']}\n(Add image: {base_image_path})", 
+             fill=(0, 0, 0), anchor="mm")
+    return img
+
+
+def load_template_image(template: Dict) -> Image.Image:
     """
-    Generate a meme image with the rizz score
+    Get the ready-to-draw base image for a template, loading it on first use
     
-    Args:
-        score: The rizz score (0-100)
-        template_id: Optional template ID, if None picks random
+    The returned image is shared - callers must copy() it before drawing.
+    """
+    img = _template_images.get(template["id"])
+    if img is None:
+        with _template_lock:
+            img = _template_images.get(template["id"])
+            if img is None:
+                img = _render_template_base(template)
+                _template_images[template["id"]] = img
+    return img
+
+
+def warm_template_cache():
+    """Load every template image and font size in MEME_TEMPLATES up front (called at startup)"""
+    for template in MEME_TEMPLATES:
+        load_template_image(template)
+        for text_config in template["texts"]:
+            get_font(text_config["font_size"], bold=True)
+    logger.info("✅ Meme templates loaded: %s", len(_template_images))
+
+
+def resolve_template(template_id: Optional[str] = None) -> Dict:
+    """
+    Pick the template to render: the requested one, or a random available one
     
-    Returns:
-        bytes: Image bytes (PNG format)
+    Templates whose image is missing are swapped for an available template.
     """
     # Get template - random selection if no template_id provided
     if template_id:
@@ -51,56 +144,31 @@ def generate_meme(score: int, template_id: Optional[str] = None) -> bytes:
         # Randomly pick from available templates
         template = get_random_template()
     
-    # Verify template image exists, if not try to find an available one
-    backend_dir = os.path.dirname(os.path.abspath(__file__))
-    template_path = os.path.join(backend_dir, template["image_path"])
+    # Verify template image exists, if not use an available one
+    available_templates = get_available_templates()
+    if template not in available_templates and available_templates:
+        logger.warning("⚠️ Template %s image not found, using alternative: %s", template['id'], available_templates[0]['name'])
+        template = available_templates[0]
+    return template
+
+
+def generate_meme(score: int, template_id: Optional[str] = None) -> bytes:
+    """
+    Generate a meme image with the rizz score
     
-    if not os.path.exists(template_path) and not os.path.exists(template["image_path"]):
-        # Template image doesn't exist, try to find another available template
-        print(f"⚠️ Template {template['id']} image not found, looking for alternatives...")
-        from meme_templates import MEME_TEMPLATES
-        for alt_template in MEME_TEMPLATES:
-            alt_path = os.path.join(backend_dir, alt_template["image_path"])
-            if os.path.exists(alt_path) or os.path.exists(alt_template["image_path"]):
-                print(f"✅ Using alternative template: {alt_template['name']}")
-                template = alt_template
-                break
+    Args:
+        score: The rizz score (0-100)
+        template_id: Optional template ID, if None picks random
     
-    print(f"🎨 Generating meme with template: {template['name']} (ID: {template['id']})")
+    Returns:
+        bytes: Image bytes (PNG format)
+    """
+    template = resolve_template(template_id)
     
-    # Load base image - resolve path relative to backend directory
-    base_image_path = template["image_path"]
+    logger.debug("🎨 Generating meme with template: %s (ID: %s)", template['name'], template['id'])
     
-    # Try to resolve path relative to backend directory
-    backend_dir = os.path.dirname(os.path.abspath(__file__))
-    full_image_path = os.path.join(backend_dir, base_image_path)
-    
-    # Check if image exists
-    if not os.path.exists(full_image_path):
-        print(f"⚠️ Template image not found: {full_image_path}, trying: {base_image_path}")
-        if os.path.exists(base_image_path):
-            full_image_path = base_image_path
-            img = Image.open(full_image_path)
-            # Resize if needed
-            if img.size != tuple(template["image_size"]):
-                img = img.resize(template["image_size"], Image.Resampling.LANCZOS)
-        else:
-            print(f"⚠️ Creating placeholder for missing template: {template['name']}")
-            # Create a placeholder image
-            img = Image.new('RGB', template["image_size"], color=(200, 200, 200))
-            draw = ImageDraw.Draw(img)
-            # Draw a simple placeholder
-            draw.rectangle([10, 10, template["image_size"][0]-10, template["image_size"][1]-10], 
-                          outline=(100, 100, 100), width=3)
-            draw.text((template["image_size"][0]//2, template["image_size"][1]//2), 
-                     f"Meme Template: {template['name']}\n(Add image: {base_image_path})", 
-                     fill=(0, 0, 0), anchor="mm")
-    else:
-        # Image exists, load it
-        img = Image.open(full_image_path)
-        # Resize if needed
-        if img.size != tuple(template["image_size"]):
-            img = img.resize(template["image_size"], Image.Resampling.LANCZOS)
+    # Start from a copy of the pre-decoded, pre-resized base image
+    img = load_template_image(template).copy()
     
     draw = ImageDraw.Draw(img)
     
@@ -148,39 +216,7 @@ def generate_meme(score: int, template_id: Optional[str] = None) -> bytes:
             # Approximate line height
             line_height = text_config["font_size"] + 10
         
-        # Draw text with stroke (outline)
-        if text_config.get("stroke_width", 0) > 0:
-            for line_idx, line_text in enumerate(text_lines):
-                if not line_text.strip():
-                    continue
-                    
-                # Calculate y position for this line
-                y_pos = position[1] + (line_idx * line_height if is_multiline else 0)
-                
-                # Draw stroke for this line
-                for adj in range(-text_config["stroke_width"], text_config["stroke_width"] + 1):
-                    for adj2 in range(-text_config["stroke_width"], text_config["stroke_width"] + 1):
-                        if adj != 0 or adj2 != 0:
-                            if is_multiline:
-                                # For multiline, don't use anchor
-                                draw.text(
-                                    (position[0] + adj, y_pos + adj2),
-                                    line_text,
-                                    font=font,
-                                    fill=text_config["stroke_color"]
-                                )
-                            else:
-                                # For single line, use anchor
-                                draw.text(
-                                    (position[0] + adj, y_pos + adj2),
-                                    line_text,
-                                    font=font,
-                                    fill=text_config["stroke_color"],
-                                    anchor="lt" if text_config.get("align") == "left" else 
-                                           "mt" if text_config.get("align") == "center" else "rt"
-                                )
-        
-        # Draw main text
+        # Draw each line once, with Pillow's native stroke (outline)
         for line_idx, line_text in enumerate(text_lines):
             if not line_text.strip():
                 continue
@@ -188,24 +224,18 @@ def generate_meme(score: int, template_id: Optional[str] = None) -> bytes:
             # Calculate y position for this line
             y_pos = position[1] + (line_idx * line_height if is_multiline else 0)
             
-            if is_multiline:
+            draw.text(
+                (position[0], y_pos),
+                line_text,
+                font=font,
+                fill=text_config["color"],
                 # For multiline, don't use anchor
-                draw.text(
-                    (position[0], y_pos),
-                    line_text,
-                    font=font,
-                    fill=text_config["color"]
-                )
-            else:
-                # For single line, use anchor
-                draw.text(
-                    (position[0], y_pos),
-                    line_text,
-                    font=font,
-                    fill=text_config["color"],
-                    anchor="lt" if text_config.get("align") == "left" else 
-                           "mt" if text_config.get("align") == "center" else "rt"
-                )
+                anchor=None if is_multiline else
+                       "lt" if text_config.get("align") == "left" else
+                       "mt" if text_config.get("align") == "center" else "rt",
+                stroke_width=text_config.get("stroke_width", 0),
+                stroke_fill=text_config.get("stroke_color")
+            )
     
     # Convert to bytes
     img_bytes = io.BytesIO()
@@ -215,37 +245,111 @@ def generate_meme(score: int, template_id: Optional[str] = None) -> bytes:
     return img_bytes.getvalue()
 
 
+def meme_catalog_path(template_id: str, score: int) -> str:
+    """Deterministic storage path of the pre-rendered meme for (template, score)"""
+    return f"memes/{MEME_CATALOG_VERSION}/{template_id}/{score}.png"
+
+
+def load_meme_catalog_index(supabase_client) -> int:
+    """
+    Seed the local URL index from memes already in storage
+    
+    One list call per template instead of an existence check per meme.
+    
+    Returns:
+        int: Number of catalog entries found
+    """
+    bucket = supabase_client.storage.from_(MEME_BUCKET)
+    found = 0
+    for template in get_available_templates():
+        folder = f"memes/{MEME_CATALOG_VERSION}/{template['id']}"
+        for item in bucket.list(folder, {"limit": 200}):
+            name = item.get("name", "")
+            score_str = name[:-len(".png")] if name.endswith(".png") else ""
+            if score_str.isdigit():
+                score = int(score_str)
+                _catalog_urls[(template["id"], score)] = bucket.get_public_url(meme_catalog_path(template["id"], score))
+                found += 1
+    logger.info("✅ Meme catalog index loaded: %s memes", found)
+    return found
+
+
+def get_catalog_meme(score: int, supabase_client, template_id: Optional[str] = None) -> Tuple[str, int, str, bool]:
+    """
+    Pick the template for a score and compute its catalog URL without any I/O
+    
+    Returns:
+        Tuple of (template_id, clamped score, public URL, whether it is known to be uploaded)
+    """
+    score = max(0, min(100, int(score)))
+    template = resolve_template(template_id)
+    
+    meme_url = _catalog_urls.get((template["id"], score))
+    if meme_url:
+        return template["id"], score, meme_url, True
+    
+    # Public URLs are derived from the path alone, so this doesn't touch storage
+    meme_url = supabase_client.storage.from_(MEME_BUCKET).get_public_url(meme_catalog_path(template["id"], score))
+    return template["id"], score, meme_url, False
+
+
 def generate_meme_and_upload(score: int, supabase_client, template_id: Optional[str] = None) -> str:
     """
-    Generate meme and upload to Supabase Storage
+    Get the public URL of the meme for this score, rendering and uploading
+    it only the first time each (template, score) pair is needed
     
     Args:
         score: The rizz score
         supabase_client: Supabase client instance
-        template_id: Optional template ID
+        template_id: Optional template ID, if None picks random
     
     Returns:
-        str: Public URL of the uploaded meme
+        str: Public URL of the catalog meme
     """
-    # Generate meme image
-    meme_bytes = generate_meme(score, template_id)
-    
-    # Upload to Supabase
-    from datetime import datetime
-    import uuid
-    
-    unique_filename = f"memes/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.png"
+    template_id, score, meme_url, uploaded = get_catalog_meme(score, supabase_client, template_id)
+    if uploaded:
+        return meme_url
     
-    upload_response = supabase_client.storage.from_("chat-images").upload(
-        unique_filename,
-        meme_bytes,
-        file_options={"content-type": "image/png", "upsert": "true"}
-    )
+    file_path = meme_catalog_path(template_id, score)
+    bucket = supabase_client.storage.from_(MEME_BUCKET)
     
-    # Get public URL
-    meme_url = supabase_client.storage.from_("chat-images").get_public_url(unique_filename)
+    # Another process (or a previous run) may already have rendered it
+    if not bucket.exists(file_path):
+        meme_bytes = generate_meme(score, template_id)
+        bucket.upload(
+            file_path,
+            meme_bytes,
+            file_options={"content-type": "image/png", "upsert": "true"}
+        )
+        logger.info("✅ Meme rendered and uploaded: %s", file_path)
     
-    print(f"✅ Meme uploaded: {meme_url}")
+    _catalog_urls[(template_id, score)] = meme_url
     
     return meme_url
 
+
+def warm_meme_catalog(supabase_client) -> int:
+    """
+    Render and upload every (template, score) meme that isn't in storage yet
+    
+    Returns:
+        int: Number of catalog entries available afterwards
+    """
+    load_meme_catalog_index(supabase_client)
+    for template in get_available_templates():
+        for score in range(101):
+            if (template["id"], score) not in _catalog_urls:
+                generate_meme_and_upload(score, supabase_client, template["id"])
+    return len(_catalog_urls)
+
+
+if __name__ == "__main__":
+    # Warm-up job: python meme_generator.py
+    from dotenv import load_dotenv
+    from supabase import create_client
+    
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY"))
+    total = warm_meme_catalog(client)
+    print(f"✅ Meme catalog ready: {total} memes")
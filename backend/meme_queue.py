@@ -0,0 +1,111 @@
+"""
+Background queue that renders and uploads catalog memes off the request path
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class MemeRenderQueue:
+    """
+    Bounded async queue feeding a small pool of render/upload workers
+
+    Jobs are keyed by (template_id, score); a job that is already pending is
+    not queued twice. When the queue is full, submit() refuses the job so the
+    caller can degrade (skip the meme) instead of piling up work.
+    """
+
+    def __init__(self, render: Callable[[int, str], str], workers: int = 2, max_depth: int = 100):
+        """
+        Args:
+            render: Blocking callable (score, template_id) -> meme URL, run in a worker thread
+            workers: Number of concurrent render/upload workers
+            max_depth: Max queued jobs before new ones are rejected
+        """
+        self.render = render
+        self.workers = workers
+        self.max_depth = max_depth
+        self.queue: Optional[asyncio.Queue] = None
+        self._pending = set()
+        self._tasks = []
+        self._latencies_ms = deque(maxlen=500)
+        self.counters = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+
+    def start(self):
+        """Start the worker tasks (call from a running event loop)"""
+        self.queue = asyncio.Queue(maxsize=self.max_depth)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        """Give queued jobs up to `timeout` seconds to finish, then cancel the workers"""
+        if self.queue is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Meme queue stopped with %s jobs unfinished", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, score: int, template_id: str) -> bool:
+        """
+        Queue a render/upload job
+
+        Returns:
+            bool: False if the queue is saturated (or not started) and the job was dropped
+        """
+        key = (template_id, score)
+        if key in self._pending:
+            self.counters["deduplicated"] += 1
+            return True
+        if self.queue is None:
+            self.counters["rejected"] += 1
+            return False
+        try:
+            self.queue.put_nowait((key, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            return False
+        self._pending.add(key)
+        self.counters["submitted"] += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            (template_id, score), enqueued_at = await self.queue.get()
+            try:
+                await asyncio.to_thread(self.render, score, template_id)
+                self.counters["completed"] += 1
+            except Exception as e:
+                logger.warning("⚠️ Background meme render failed (%s, %s): %s", template_id, score, e)
+                self.counters["failed"] += 1
+            finally:
+                self._pending.discard((template_id, score))
+                self._latencies_ms.append((time.perf_counter() - enqueued_at) * 1000)
+                self.queue.task_done()
+
+    def stats(self) -> Dict:
+        latencies = sorted(self._latencies_ms)
+        return {
+            **self.counters,
+            "depth": self.queue.qsize() if self.queue else 0,
+            "max_depth": self.max_depth,
+            "in_flight": len(self._pending),
+            "workers": len(self._tasks),
+            "latency_ms_p50": percentile(latencies, 0.50, 1),
+            "latency_ms_p95": percentile(latencies, 0.95, 1),
+        }
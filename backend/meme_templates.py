@@ -2,9 +2,14 @@
 Meme template configurations for Rizz Calculator
 Each template defines text positions, fonts, colors, and the base image path
 """
+import logging
+import os
 import random
+from functools import lru_cache
 from typing import Dict, List, Tuple
 
+logger = logging.getLogger(__name__)
+
 # Meme template configurations
 MEME_TEMPLATES = [
     {
@@ -182,27 +187,32 @@ MEME_TEMPLATES = [
 ]
 
 
-def get_random_template() -> Dict:
-    """Get a random meme template from available templates"""
-    import os
-    
+@lru_cache(maxsize=1)
+def get_available_templates() -> Tuple[Dict, ...]:
+    """Templates whose image file exists, checked once per process"""
     # Get backend directory to check for template images
     backend_dir = os.path.dirname(os.path.abspath(__file__))
     
-    # Filter to only templates that have images available
     available_templates = []
     for template in MEME_TEMPLATES:
         template_path = os.path.join(backend_dir, template["image_path"])
         # Check if template image exists
         if os.path.exists(template_path) or os.path.exists(template["image_path"]):
             available_templates.append(template)
+    return tuple(available_templates)
+
+
+def get_random_template() -> Dict:
+    """Get a random meme template from available templates"""
+    # Filter to only templates that have images available
+    available_templates = get_available_templates()
     
     # If we have available templates, pick randomly
     if available_templates:
         return random.choice(available_templates)
     
     # Fallback to disaster_girl if no templates found
-    print("⚠️ No template images found, using disaster_girl as fallback")
+    logger.warning("⚠️ No template images found, using disaster_girl as fallback")
     return get_template_by_id("disaster_girl")
 
 
@@ -0,0 +1,259 @@
+"""
+Minimal in-process metrics with Prometheus text exposition
+Counters, gauges and fixed-bucket histograms guarded by a lock each, so
+observations are a few dictionary operations and safe from worker threads.
+Components that already keep their own counters are exported through
+collectors evaluated at scrape time, which costs nothing between scrapes
+"""
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (labels, value) pairs produced by a collector for one metric family
+Samples = List[Tuple[Dict[str, str], float]]
+
+
+def percentile(ordered: Sequence[float], fraction: float, digits: Optional[int] = None) -> Optional[float]:
+    """
+    Value at `fraction` (0-1) of an already sorted sequence, by nearest rank
+
+    Args:
+        ordered: Sorted values
+        fraction: 0.5 for the median, 0.95 for p95, ...
+        digits: Round the value to this many decimals
+
+    Returns:
+        The value, or None if the sequence is empty
+    """
+    if not ordered:
+        return None
+    value = ordered[int(fraction * (len(ordered) - 1))]
+    return round(value, digits) if digits is not None else value
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in series:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and scrape-time collectors, and renders them in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Samples]]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, Samples]]]):
+        """
+        Add a scrape-time collector
+
+        Args:
+            collect: Returns (name, type, help, samples) tuples, one per metric family
+        """
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                logger.warning("⚠️ Metrics collector failed: %s", e)
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rizz_stage_duration_seconds",
+    "Time spent in each analysis pipeline stage",
+    ("stage",)
+)
+STAGE_IN_FLIGHT = REGISTRY.gauge(
+    "rizz_stage_in_flight",
+    "Pipeline stages currently running",
+    ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "rizz_stage_errors_total",
+    "Pipeline stages that raised",
+    ("stage",)
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a pipeline stage (usable around sync or awaited code)"""
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_IN_FLIGHT.dec(stage=stage)
+
+
+def stats_collector(components: Dict[str, Any], prefix: str = "rizz") -> Callable[[], List[Tuple[str, str, str, Samples]]]:
+    """
+    Collector exporting components' stats() dicts
+
+    Keys the component counts in its `counters` dict become counters
+    (`<prefix>_<component>_<key>_total`); other numeric values become gauges.
+    Nested dicts become one family with a `kind` label per key, and string
+    values (e.g. breaker state) a gauge of 1 labelled with the value.
+
+    Args:
+        components: Component name -> the component (anything with stats() and optionally counters)
+    """
+    def collect():
+        families = []
+        for component_name, component in components.items():
+            counter_keys = set(getattr(component, "counters", {}) or {})
+            for key, value in component.stats().items():
+                name = f"{prefix}_{component_name}_{key}"
+                if isinstance(value, dict):
+                    samples = [({"kind": str(sub_key)}, float(sub_value)) for sub_key, sub_value in value.items() if _is_number(sub_value)]
+                    if samples:
+                        families.append((name, "gauge", f"{component_name} {key}", samples))
+                elif _is_number(value):
+                    if key in counter_keys:
+                        families.append((f"{name}_total", "counter", f"{component_name} {key}", [({}, float(value))]))
+                    else:
+                        families.append((name, "gauge", f"{component_name} {key}", [({}, float(value))]))
+                elif isinstance(value, bool):
+                    families.append((name, "gauge", f"{component_name} {key}", [({}, 1.0 if value else 0.0)]))
+                elif isinstance(value, str):
+                    families.append((name, "gauge", f"{component_name} {key}", [({"value": value}, 1.0)]))
+        return families
+    return collect
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -0,0 +1,128 @@
+"""
+Response cache with stale-while-revalidate for read-heavy JSON endpoints
+Bodies are serialized once per refresh and carry a strong ETag so clients
+and CDNs can revalidate with If-None-Match
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """A serialized JSON body plus its ETag and fetch time"""
+
+    def __init__(self, value: Any, fetched_at: float):
+        self.value = value
+        self.body = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.fetched_at = fetched_at
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class SWRCache:
+    """
+    Per-key cache that serves fresh entries for `ttl` seconds, then serves
+    stale entries for up to `stale_ttl` more while a single background
+    refresh runs. Older (or missing) entries are refreshed in the
+    foreground, with concurrent callers sharing the same refresh.
+    At most `max_entries` keys are kept, least recently used first out.
+    """
+
+    def __init__(self, ttl: float = 5.0, stale_ttl: float = 30.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self.counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_failures": 0,
+        }
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> CachedResponse:
+        """
+        Get the cached response for `key`, calling `fetch` to (re)build it when needed
+
+        Args:
+            key: Cache key (e.g. the endpoint's query parameters)
+            fetch: Coroutine function returning the JSON-serializable value
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            age = entry.age()
+            if age < self.ttl:
+                self.counters["hits"] += 1
+                return entry
+            if age < self.ttl + self.stale_ttl:
+                self.counters["stale_hits"] += 1
+                self._start_refresh(key, fetch)
+                return entry
+
+        self.counters["misses"] += 1
+        # Shield so a cancelled request doesn't cancel the refresh other callers await
+        return await asyncio.shield(self._start_refresh(key, fetch))
+
+    def _start_refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Return the in-flight refresh for `key`, starting one if none is running"""
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(key, fetch))
+            self._refreshing[key] = task
+            task.add_done_callback(self._log_background_failure)
+        return task
+
+    async def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> CachedResponse:
+        try:
+            value = await fetch()
+            entry = CachedResponse(value, time.monotonic())
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.counters["refreshes"] += 1
+            return entry
+        except Exception:
+            self.counters["refresh_failures"] += 1
+            raise
+        finally:
+            self._refreshing.pop(key, None)
+
+    @staticmethod
+    def _log_background_failure(task: asyncio.Task):
+        # Keeps "exception was never retrieved" warnings away when only a
+        # background (stale) refresh failed; foreground callers see the error
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("⚠️ Cache refresh failed: %s", task.exception())
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one key, or everything"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {**self.counters, "entries": len(self._entries), "ttl": self.ttl, "stale_ttl": self.stale_ttl}
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches the current ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
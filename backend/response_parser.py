@@ -0,0 +1,287 @@
+"""
+Parsing and validation of Gemini's rizz analysis
+The expected shape is declared once (RESPONSE_SCHEMA) and sent to Gemini as
+its response_schema; replies are decoded with orjson when it is installed and
+normalized to {score, suggestions, reasoning}, counting every repair so
+prompt or model regressions show up in /stats/
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_DECODER = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_DECODER = "json"
+
+SUGGESTION_COUNT = 3
+
+# Structured-output schema for Gemini (OpenAPI subset understood by the SDK;
+# it has no numeric bounds, so the 0-100 range is enforced when parsing)
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer", "description": "Rizz score from 0 to 100"},
+        "suggestions": {
+            "type": "array",
+            "items": {"type": "string"},
+            "min_items": SUGGESTION_COUNT,
+            "max_items": SUGGESTION_COUNT,
+            "description": "Exactly 3 specific, actionable tips"
+        },
+        "reasoning": {"type": "string", "description": "2-3 punchy sentences explaining the score"}
+    },
+    "required": ["score", "suggestions", "reasoning"]
+}
+
+
+def batch_response_schema(image_count: int) -> Dict:
+    """RESPONSE_SCHEMA plus a per_image array with one entry per screenshot"""
+    return {
+        **RESPONSE_SCHEMA,
+        "properties": {
+            **RESPONSE_SCHEMA["properties"],
+            "per_image": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "score": {"type": "integer", "description": "Rizz score from 0 to 100 for this screenshot"},
+                        "reasoning": {"type": "string", "description": "One sentence about this screenshot"}
+                    },
+                    "required": ["score", "reasoning"]
+                },
+                "min_items": image_count,
+                "max_items": image_count
+            }
+        },
+        "required": RESPONSE_SCHEMA["required"] + ["per_image"]
+    }
+
+
+GENERIC_SUGGESTION = "Keep practicing and refining your approach."
+
+# Returned when the model output can't be used at all
+FALLBACK_RESULT = {
+    "score": 50,
+    "suggestions": [
+        "Try asking more engaging questions to show interest.",
+        "Add emojis or playful language to improve the vibe.",
+        "End with a callback hook or question to keep the conversation going."
+    ],
+    "reasoning": "Unable to parse AI response, using default score."
+}
+
+
+class MalformedResponse(ValueError):
+    """The model output has no usable analysis in it"""
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """
+    Find the first complete top-level JSON object in `text`
+
+    Handles markdown fences and chatter around the object, and braces
+    inside string values.
+    """
+    start = text.find("{")
+    while start != -1:
+        depth = 0
+        in_string = False
+        escaped = False
+        for position in range(start, len(text)):
+            char = text[position]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:position + 1]
+        # Unbalanced from here on; try the next opening brace
+        start = text.find("{", start + 1)
+    return None
+
+
+class ResponseParser:
+    """Turns raw model text into a validated result, counting repairs and fallbacks"""
+
+    def __init__(self):
+        self.counters = {
+            "parsed": 0,
+            "clean": 0,
+            "repaired": 0,
+            "malformed": 0,
+            "retries": 0,
+            "fallbacks": 0,
+        }
+        self.repairs = {
+            "extracted_object": 0,
+            "score_coerced": 0,
+            "score_clamped": 0,
+            "suggestions_split": 0,
+            "suggestions_padded": 0,
+            "suggestions_truncated": 0,
+            "reasoning_missing": 0,
+            "per_image_mismatch": 0,
+        }
+
+    def parse(self, text: Optional[str]) -> Dict:
+        """
+        Parse and validate one model reply
+
+        Args:
+            text: Raw response text
+
+        Returns:
+            Dict with score (int 0-100), suggestions (exactly 3 strings) and reasoning
+
+        Raises:
+            MalformedResponse: If no usable analysis could be recovered
+        """
+        return self._parse(text)
+
+    def parse_batch(self, text: Optional[str], image_count: int) -> Dict:
+        """
+        Parse a multi-screenshot reply (see batch_response_schema)
+
+        Returns:
+            Same as parse(), plus per_image: one {score, reasoning} per screenshot
+
+        Raises:
+            MalformedResponse: If no usable analysis could be recovered
+        """
+        return self._parse(text, image_count)
+
+    def _repair(self, kind: str, applied: List[str]):
+        self.repairs[kind] += 1
+        applied.append(kind)
+
+    def _parse(self, text: Optional[str], image_count: Optional[int] = None) -> Dict:
+        applied: List[str] = []
+        try:
+            data = self._decode(text, applied)
+            score = self._parse_score(data.get("score"), applied)
+            suggestions = self._parse_suggestions(data.get("suggestions"), applied)
+            reasoning = self._parse_reasoning(data.get("reasoning"), applied)
+            result = {"score": score, "suggestions": suggestions, "reasoning": reasoning}
+            if image_count is not None:
+                result["per_image"] = self._parse_per_image(data.get("per_image"), image_count, score, applied)
+        except MalformedResponse:
+            self.counters["malformed"] += 1
+            raise
+
+        self.counters["parsed"] += 1
+        if applied:
+            self.counters["repaired"] += 1
+            logger.info("🩹 Repaired model response: %s", ', '.join(applied))
+        else:
+            self.counters["clean"] += 1
+        return result
+
+    def _decode(self, text: Optional[str], applied: List[str]) -> Dict:
+        text = (text or "").strip()
+        if not text:
+            raise MalformedResponse("Empty response text from Gemini API")
+
+        try:
+            data = _loads(text)
+        except ValueError:
+            # Markdown fences or prose around the object
+            candidate = extract_json_object(text)
+            if candidate is None:
+                raise MalformedResponse("No JSON object in response")
+            try:
+                data = _loads(candidate)
+            except ValueError as e:
+                raise MalformedResponse(f"Invalid JSON: {e}")
+            self._repair("extracted_object", applied)
+
+        if not isinstance(data, dict):
+            raise MalformedResponse(f"Expected a JSON object, got {type(data).__name__}")
+        return data
+
+    def _parse_reasoning(self, value: Any, applied: List[str]) -> str:
+        if not isinstance(value, str) or not value.strip():
+            self._repair("reasoning_missing", applied)
+            return ""
+        return value.strip()
+
+    def _parse_per_image(self, value: Any, image_count: int, overall_score: int, applied: List[str]) -> List[Dict]:
+        entries = []
+        for item in value if isinstance(value, list) else []:
+            if not isinstance(item, dict):
+                continue
+            try:
+                score = self._parse_score(item.get("score"), applied)
+            except MalformedResponse:
+                continue
+            reasoning = item.get("reasoning")
+            entries.append({"score": score, "reasoning": reasoning.strip() if isinstance(reasoning, str) else ""})
+        if len(entries) != image_count:
+            # Per-image detail is a bonus; keep the overall verdict and fill gaps with it
+            self._repair("per_image_mismatch", applied)
+            entries = entries[:image_count]
+            entries += [{"score": overall_score, "reasoning": ""}] * (image_count - len(entries))
+        return entries
+
+    def _parse_score(self, value: Any, applied: List[str]) -> int:
+        if isinstance(value, bool):
+            raise MalformedResponse("Invalid score in response")
+        if not isinstance(value, int):
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise MalformedResponse("Invalid score in response")
+            if number != number or number in (float("inf"), float("-inf")):
+                raise MalformedResponse("Invalid score in response")
+            value = round(number)
+            self._repair("score_coerced", applied)
+        if not 0 <= value <= 100:
+            value = max(0, min(100, value))
+            self._repair("score_clamped", applied)
+        return value
+
+    def _parse_suggestions(self, value: Any, applied: List[str]) -> List[str]:
+        if isinstance(value, str):
+            # A single string instead of an array: split it into sentences
+            suggestions = [part.strip() for part in value.split(".") if part.strip()]
+            self._repair("suggestions_split", applied)
+        elif isinstance(value, list):
+            suggestions = [str(item).strip() for item in value if isinstance(item, (str, int, float)) and str(item).strip()]
+        else:
+            raise MalformedResponse("Suggestions must be an array")
+
+        if not suggestions:
+            raise MalformedResponse("No suggestions in response")
+        if len(suggestions) > SUGGESTION_COUNT:
+            self._repair("suggestions_truncated", applied)
+            suggestions = suggestions[:SUGGESTION_COUNT]
+        elif len(suggestions) < SUGGESTION_COUNT:
+            self._repair("suggestions_padded", applied)
+            suggestions += [GENERIC_SUGGESTION] * (SUGGESTION_COUNT - len(suggestions))
+        return suggestions
+
+    def fallback(self, image_count: Optional[int] = None) -> Dict:
+        """The default-score result, counted as a fallback"""
+        self.counters["fallbacks"] += 1
+        result = {**FALLBACK_RESULT, "suggestions": list(FALLBACK_RESULT["suggestions"])}
+        if image_count is not None:
+            result["per_image"] = [{"score": FALLBACK_RESULT["score"], "reasoning": ""} for _ in range(image_count)]
+        return result
+
+    def stats(self) -> Dict:
+        return {**self.counters, "repairs": dict(self.repairs), "decoder": JSON_DECODER}
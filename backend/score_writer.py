@@ -0,0 +1,222 @@
+"""
+Write-behind buffer for score rows
+A single long-lived task batches rows into multi-row inserts, flushing by
+size or time, retrying transient failures with backoff, isolating rows the
+database refuses, and draining on shutdown
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop() so the writer flushes what it has and exits
+_STOP = object()
+
+# SQLSTATE classes PostgREST answers with a 5xx: connection, transaction
+# rollback (deadlock/serialization), resources, operator intervention, system
+TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57", "58", "XX")
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    Whether an insert failed for a reason retrying won't fix (a 4xx from PostgREST)
+
+    postgrest's APIError carries the SQLSTATE or PGRST code rather than the
+    HTTP status (the status itself when the body wasn't JSON). Transport
+    errors and timeouts have no code and count as transient.
+    """
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return 400 <= status < 500
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return 400 <= code < 500
+    if not isinstance(code, str) or not code:
+        return False
+    if code.startswith("PGRST"):
+        # PGRST0xx: database unreachable or pool timeout; PGRSTX: internal error
+        return not code.startswith(("PGRST0", "PGRSTX"))
+    return code[:2] not in TRANSIENT_SQLSTATE_CLASSES
+
+
+class ScoreWriter:
+    """Batches score inserts from a single writer task"""
+
+    def __init__(
+        self,
+        insert_rows: Callable[[List[Dict]], Awaitable],
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        max_retries: int = 5,
+        max_buffer: int = 10000,
+        on_flush: Optional[Callable[[List[Dict]], None]] = None
+    ):
+        """
+        Args:
+            insert_rows: Coroutine function inserting a list of rows in one request,
+                optionally returning the rows as stored
+            batch_size: Flush as soon as this many rows are buffered
+            flush_interval: Max seconds a row waits before its batch is flushed
+            max_retries: Attempts per batch on transient failures before its rows are dropped
+            max_buffer: Max buffered rows; beyond this enqueue() refuses rows
+            on_flush: Called with each batch after it is written (the stored rows
+                insert_rows returned, or the batch itself if it returned nothing)
+        """
+        self.insert_rows = insert_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_buffer = max_buffer
+        self.on_flush = on_flush
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flush_ms = deque(maxlen=500)
+        self.counters = {
+            "enqueued": 0,
+            "rows_written": 0,
+            "batches": 0,
+            "retries": 0,
+            "failed_batches": 0,
+            "split_batches": 0,
+            "rejected_rows": 0,
+            "dropped_rows": 0,
+        }
+
+    def start(self):
+        """Start the writer task (call from a running event loop)"""
+        self.queue = asyncio.Queue(maxsize=self.max_buffer)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 15.0):
+        """Stop accepting rows and flush everything buffered, waiting up to `timeout` seconds"""
+        if self._task is None:
+            return
+        self._stopping = True
+        await self.queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Score writer stopped with %s rows unflushed", self.queue.qsize())
+            self.counters["dropped_rows"] += self.queue.qsize()
+        self._task = None
+
+    def enqueue(self, row: Dict) -> bool:
+        """
+        Buffer a row for insertion
+
+        Returns:
+            bool: False if the writer is stopped or the buffer is full and the row was dropped
+        """
+        if self.queue is None or self._stopping:
+            self.counters["dropped_rows"] += 1
+            return False
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.counters["dropped_rows"] += 1
+            return False
+        self.counters["enqueued"] += 1
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self.queue.get()
+            if row is _STOP:
+                return
+            batch = [row]
+            stop_requested = False
+            deadline = loop.time() + self.flush_interval
+
+            # Fill the batch until it is full or the oldest row has waited long enough
+            while len(batch) < self.batch_size:
+                if self.queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    row = self.queue.get_nowait()
+                if row is _STOP:
+                    stop_requested = True
+                    break
+                batch.append(row)
+
+            await self._flush(batch)
+            if stop_requested:
+                # Drain anything left behind the stop marker
+                while not self.queue.empty():
+                    leftover = []
+                    while not self.queue.empty() and len(leftover) < self.batch_size:
+                        leftover.append(self.queue.get_nowait())
+                    await self._flush(leftover)
+                return
+
+    async def _flush(self, batch: List[Dict]):
+        """
+        Insert a batch, retrying transient failures with jittered exponential backoff
+
+        A batch the database refuses outright (constraint, RLS, bad value) is
+        split in half and each half flushed again, so only the offending rows
+        are dropped.
+        """
+        start = time.perf_counter()
+        for attempt in range(self.max_retries):
+            try:
+                written = await self.insert_rows(batch)
+            except Exception as e:
+                if is_permanent_error(e):
+                    await self._split_rejected(batch, e)
+                    return
+                if attempt == self.max_retries - 1:
+                    logger.warning("⚠️ Failed to store %s scores after %s attempts: %s", len(batch), self.max_retries, e)
+                    break
+                wait_time = min(30.0, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                logger.warning("⚠️ Score insert failed (%s), retrying in %.1fs...", e, wait_time)
+                self.counters["retries"] += 1
+                await asyncio.sleep(wait_time)
+                continue
+            self.counters["rows_written"] += len(batch)
+            self.counters["batches"] += 1
+            self._flush_ms.append((time.perf_counter() - start) * 1000)
+            if self.on_flush:
+                try:
+                    self.on_flush(written or batch)
+                except Exception as e:
+                    logger.warning("⚠️ Score flush listener failed: %s", e)
+            return
+        self.counters["failed_batches"] += 1
+        self.counters["dropped_rows"] += len(batch)
+
+    async def _split_rejected(self, batch: List[Dict], error: Exception):
+        """Halve a refused batch until the rows the database rejects are isolated and dropped"""
+        if len(batch) == 1:
+            logger.warning("⚠️ Score row rejected by the database, dropping it: %s", error)
+            self.counters["rejected_rows"] += 1
+            self.counters["dropped_rows"] += 1
+            return
+        self.counters["split_batches"] += 1
+        middle = len(batch) // 2
+        await self._flush(batch[:middle])
+        await self._flush(batch[middle:])
+
+    def stats(self) -> Dict:
+        flush_ms = sorted(self._flush_ms)
+        return {
+            **self.counters,
+            "depth": self.queue.qsize() if self.queue else 0,
+            "max_buffer": self.max_buffer,
+            "flush_ms_p50": percentile(flush_ms, 0.50, 1),
+            "flush_ms_p95": percentile(flush_ms, 0.95, 1),
+        }
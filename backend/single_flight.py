@@ -0,0 +1,97 @@
+"""
+Request coalescing helpers
+SingleFlight lets concurrent callers with the same key share one in-flight
+call; IdempotencyStore remembers completed responses so retried requests
+carrying the same Idempotency-Key are replayed instead of re-executed
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; duplicates await the same result"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.counters = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` for `key`, or join the call already running for it
+
+        The call runs in its own task, so a caller that disconnects or is
+        cancelled doesn't cancel the work the other callers are waiting on.
+
+        Args:
+            key: Identifies duplicate work
+            fn: Coroutine function doing the work
+
+        Returns:
+            Whatever `fn` returns (exceptions are raised to every caller)
+        """
+        task = self._flights.get(key)
+        if task is None:
+            self.counters["leaders"] += 1
+            task = asyncio.create_task(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.counters["followers"] += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        self._flights.pop(key, None)
+        # Every waiter may have given up already (e.g. its own deadline fired
+        # first); retrieve the exception so asyncio doesn't log it as lost
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {**self.counters, "in_flight": len(self._flights)}
+
+
+class IdempotencyStore:
+    """
+    Completed responses by idempotency key, kept for `ttl` seconds
+
+    Each entry records a fingerprint of the request it answered, so reusing
+    a key for a different request can be rejected instead of replayed.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Hashable, Any]]" = OrderedDict()
+        self.counters = {"stored": 0, "replayed": 0, "conflicts": 0}
+
+    def get(self, key: str, fingerprint: Hashable) -> Optional[Any]:
+        """
+        Stored response for `key`, or None
+
+        Raises:
+            ValueError: If `key` was used for a request with another fingerprint
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_fingerprint, response = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        if stored_fingerprint != fingerprint:
+            self.counters["conflicts"] += 1
+            raise ValueError("Idempotency-Key was already used for a different request")
+        self.counters["replayed"] += 1
+        return response
+
+    def set(self, key: str, fingerprint: Hashable, response: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, fingerprint, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.counters["stored"] += 1
+
+    def stats(self) -> Dict:
+        return {**self.counters, "entries": len(self._entries), "ttl": self.ttl}
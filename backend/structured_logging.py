@@ -0,0 +1,200 @@
+"""
+Structured logging
+Records are sampled per level and tagged with the current request id in the
+calling task, then handed to a queue; a background thread formats them as
+one JSON object per line and writes them out, so request handlers never
+block on stdout
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from typing import Dict, Mapping, Optional
+
+# Request id of the request being handled, set by the request-id middleware
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+MAX_REQUEST_ID_LENGTH = 64
+
+# Never dumped, even when request dumps are enabled
+REDACTED_HEADERS = {"authorization", "cookie", "set-cookie", "apikey", "x-api-key", "proxy-authorization"}
+
+# LogRecord attributes that aren't user-supplied `extra` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Client-supplied request id if it is short and printable, else a fresh one"""
+    if incoming and len(incoming) <= MAX_REQUEST_ID_LENGTH and incoming.isprintable() and '"' not in incoming:
+        return incoming
+    return uuid.uuid4().hex
+
+
+def parse_sample_rates(spec: str) -> Dict[int, float]:
+    """
+    Parse LOG_SAMPLE_RATES, e.g. "DEBUG=0.1,INFO=0.5"
+
+    Levels not listed are always kept; WARNING and above can't be sampled.
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        level = logging.getLevelName(name.strip().upper())
+        if not isinstance(level, int) or level >= logging.WARNING:
+            continue
+        rates[level] = max(0.0, min(1.0, float(value)))
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request id and extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+
+class SampledQueueHandler(logging.handlers.QueueHandler):
+    """
+    Samples records per level, tags them with the request id and enqueues
+    them unformatted; formatting and writing happen on the listener thread
+    """
+
+    def __init__(self, rates: Dict[int, float], max_queued: int = 10000):
+        super().__init__(queue.Queue(maxsize=max_queued))
+        self.rates = rates
+        self.counters = {"emitted": 0, "sampled_out": 0, "dropped": 0}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            self.counters["sampled_out"] += 1
+            return False
+        # Captured here, in the caller's context; the writer thread has none
+        record.request_id = request_id_var.get()
+        return super().filter(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render lazily-formatted args and the traceback now, while the
+        # objects they refer to are still alive and unmodified
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.counters["emitted"] += 1
+        except queue.Full:
+            # Never block a request on logging; count the loss instead
+            self.counters["dropped"] += 1
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "queued": self.queue.qsize(),
+            "level": logging.getLevelName(logging.getLogger().level),
+        }
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[SampledQueueHandler] = None
+
+
+def setup_logging() -> SampledQueueHandler:
+    """
+    Configure the root logger from the environment (idempotent)
+
+    LOG_LEVEL: Minimum level (default INFO)
+    LOG_FORMAT: json (default) or text
+    LOG_SAMPLE_RATES: Per-level keep ratios below WARNING, e.g. "DEBUG=0.1,INFO=0.5"
+    LOG_QUEUE_SIZE: Records buffered for the writer thread before new ones are dropped (default 10000)
+
+    Returns:
+        The handler installed on the root logger (for its stats)
+    """
+    global _listener, _handler
+    if _handler is not None:
+        return _handler
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(TextFormatter() if os.getenv("LOG_FORMAT", "json").lower() == "text" else JsonFormatter())
+
+    _handler = SampledQueueHandler(
+        parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "")),
+        int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    )
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    # Uvicorn's access log duplicates the request metrics; keep its warnings only
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+
+    _listener = logging.handlers.QueueListener(_handler.queue, stream)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def truncate(text: str, limit: int) -> str:
+    """`text` cut to `limit` characters, noting how much was dropped"""
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text) - limit} more chars)"
+
+
+def safe_headers(headers: Mapping[str, str], limit: int) -> Dict[str, str]:
+    """Request headers with credentials redacted and values truncated"""
+    return {
+        name: "[redacted]" if name.lower() in REDACTED_HEADERS else truncate(value, limit)
+        for name, value in headers.items()
+    }
+
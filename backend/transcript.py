@@ -0,0 +1,103 @@
+"""
+Chat transcript extraction
+A screenshot is turned into a short "Me:/Them:" transcript once, either by a
+local OCR engine (pytesseract, optional) or by a cheap transcription call, so
+the rizz prompt can be run on text instead of pixels and re-run later
+without touching the image again
+"""
+import hashlib
+import io
+import logging
+import os
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+TRANSCRIPT_PROMPT = """Transcribe the chat conversation in this screenshot.
+Output one message per line, in order, prefixed with "Me:" for messages sent by the phone's owner (usually right-aligned or coloured bubbles) and "Them:" for the other person.
+Copy the messages exactly, including emojis. Skip timestamps, names, read receipts and UI text.
+If there is no conversation in the image, output exactly: NO_CHAT"""
+
+TRANSCRIPT_PROMPT_VERSION = hashlib.sha256(TRANSCRIPT_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+# Appended to the rizz prompt when scoring a transcript instead of an image
+TEXT_SCORING_PREAMBLE = """
+### CHAT TRANSCRIPT
+The conversation below was transcribed from a screenshot. "Me:" lines are from the person being rated, "Them:" lines are from the person they are talking to.
+
+"""
+
+NO_CHAT = "NO_CHAT"
+
+
+def get_transcript_config() -> Dict:
+    """
+    Transcript settings from the environment
+
+    TRANSCRIPT_MODE: off (default), tesseract or gemini
+    TRANSCRIPT_MODEL: Model for gemini mode (default gemini-2.5-flash-lite)
+    TRANSCRIPT_MIN_CHARS: Shorter transcripts fall back to image scoring (default 40)
+    """
+    mode = os.getenv("TRANSCRIPT_MODE", "off").lower()
+    if mode == "tesseract" and pytesseract is None:
+        logger.warning("⚠️ TRANSCRIPT_MODE=tesseract but pytesseract is not installed, scoring images instead")
+        mode = "off"
+    return {
+        "mode": mode,
+        "model": os.getenv("TRANSCRIPT_MODEL", "gemini-2.5-flash-lite"),
+        "min_chars": int(os.getenv("TRANSCRIPT_MIN_CHARS", 40)),
+        "prompt_version": TRANSCRIPT_PROMPT_VERSION,
+    }
+
+
+def is_usable(transcript: Optional[str], min_chars: int) -> bool:
+    """Whether a transcript is worth scoring instead of the image"""
+    if not transcript or transcript.strip() == NO_CHAT:
+        return False
+    return len(transcript.strip()) >= min_chars
+
+
+def ocr_transcript(contents: bytes) -> str:
+    """
+    Transcribe a chat screenshot with Tesseract (blocking; run in a thread)
+
+    Lines whose text sits mostly in the right half of the image are treated
+    as the phone owner's bubbles ("Me:"), the rest as the other person's.
+
+    Args:
+        contents: Raw image bytes
+
+    Returns:
+        str: Transcript, one "Me:"/"Them:" line per OCR line
+    """
+    with Image.open(io.BytesIO(contents)) as original:
+        img = ImageOps.grayscale(ImageOps.exif_transpose(original))
+    width = img.width
+    data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+
+    # Group words into OCR lines, keeping their horizontal extent
+    lines: Dict[tuple, Dict] = {}
+    for index, word in enumerate(data["text"]):
+        word = word.strip()
+        if not word or float(data["conf"][index]) < 0:
+            continue
+        key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+        left = data["left"][index]
+        right = left + data["width"][index]
+        line = lines.setdefault(key, {"words": [], "left": left, "right": right, "top": data["top"][index]})
+        line["words"].append(word)
+        line["left"] = min(line["left"], left)
+        line["right"] = max(line["right"], right)
+
+    transcript: List[str] = []
+    for line in sorted(lines.values(), key=lambda line: line["top"]):
+        speaker = "Me" if (line["left"] + line["right"]) / 2 > width / 2 else "Them"
+        transcript.append(f"{speaker}: {' '.join(line['words'])}")
+    return "\n".join(transcript)
@@ -5,6 +5,7 @@ import { Input } from "@/components/ui/input";
 import { ImagePlus, Upload, CheckCircle2, User } from "lucide-react";
 import BottomNav from "@/components/BottomNav";
 import { useToast } from "@/hooks/use-toast";
+import { randomId } from "@/lib/utils";
 
 // Backend URL - Update this to your backend URL
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL || "http://localhost:8003";
@@ -118,7 +119,9 @@ const Analyzer = () => {
     }
 
     // Navigate to loading page, which will call the API
-    navigate("/loading", { state: { imageUrl, nickname: nickname.trim() } });
+    // One key per submission, so re-runs of the request don't store duplicate scores
+    const requestId = randomId();
+    navigate("/loading", { state: { imageUrl, nickname: nickname.trim(), requestId } });
   };
 
   return (
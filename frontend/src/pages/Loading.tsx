@@ -12,6 +12,7 @@ const Loading = () => {
   const [progress, setProgress] = useState(0);
   const imageUrl = location.state?.imageUrl;
   const nickname = location.state?.nickname;
+  const requestId = location.state?.requestId;
 
   useEffect(() => {
     if (!imageUrl || !nickname) {
@@ -35,6 +36,7 @@ const Loading = () => {
           method: "POST",
           headers: {
             "Content-Type": "application/json",
+            ...(requestId ? { "Idempotency-Key": requestId } : {}),
           },
           body: JSON.stringify({ image_url: imageUrl, nickname: nickname }),
         });
@@ -70,7 +72,7 @@ const Loading = () => {
     return () => {
       clearInterval(progressInterval);
     };
-  }, [navigate, imageUrl, nickname]);
+  }, [navigate, imageUrl, nickname, requestId]);
 
   return (
     <div className="min-h-screen flex flex-col items-center justify-center px-4">
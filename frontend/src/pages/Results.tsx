@@ -13,11 +13,16 @@ import {
   ResponsiveContainer,
 } from "recharts";
 
+const MEME_MAX_ATTEMPTS = 10;
+const MEME_RETRY_MS = 1000;
+
 const Results = () => {
   const location = useLocation();
   const navigate = useNavigate();
   const { toast } = useToast();
   const [copied, setCopied] = useState(false);
+  // Memes are rendered in the background; retry loading until it's uploaded
+  const [memeAttempt, setMemeAttempt] = useState(0);
   
   // Get results from navigation state
   const resultData = location.state;
@@ -33,6 +38,8 @@ const Results = () => {
   const reasoning = resultData.reasoning || "";
   const imageUrl = resultData.image_url || "";
   const memeUrl = resultData.meme_url || "";
+  const memeReady = resultData.meme_ready !== false;
+  const memeSrc = memeAttempt > 0 ? `${memeUrl}?attempt=${memeAttempt}` : memeUrl;
   
   // Generate shareable link for meme
   const shareableLink = memeUrl 
@@ -216,10 +223,15 @@ const Results = () => {
               )}
             </div>
             <img
-              src={memeUrl}
+              src={memeSrc}
               alt="Rizz score meme"
               className="w-full rounded-lg border border-border"
               onError={(e) => {
+                if (!memeReady && memeAttempt < MEME_MAX_ATTEMPTS) {
+                  // Still rendering - try again shortly
+                  setTimeout(() => setMemeAttempt((n) => n + 1), MEME_RETRY_MS);
+                  return;
+                }
                 console.error("Meme failed to load:", memeUrl);
                 e.currentTarget.style.display = "none";
               }}